@@ -0,0 +1,103 @@
+from sys import argv
+import json
+import random
+import time
+
+from route_finder import (
+    build_route_hierarchy, compute_planner_path, create_route_planner, find_costs,
+    find_hierarchical_path, new_search_stats, parse_arguments, record_phase, search_route
+)
+
+
+# Recursive search visits every possible route, so it is only run on small routes
+MAX_DFS_CELLS = 49
+
+
+def generate_route(rows, columns, density, seed):
+    # density is the chance of a cell being a sinkhole (0)
+    generator = random.Random(seed)
+
+    return [[0 if generator.random() < density else 1 for column in range(columns)] for row in range(rows)]
+
+
+def run_strategy(strategy, route, costs):
+    stats = new_search_stats()
+    phase_start = time.perf_counter()
+    route_with_costs = find_costs(route, costs)
+    phase_start = record_phase(stats, "find_costs", phase_start)
+
+    if strategy == "dfs":
+        min_cost, _ = search_route(route_with_costs, stats)
+    elif strategy == "lpa":
+        planner = create_route_planner([row[:] for row in route], costs)
+        phase_start = record_phase(stats, "preprocess", phase_start)
+        min_cost, _ = compute_planner_path(planner, stats)
+    else:
+        hierarchy = build_route_hierarchy(route_with_costs, stats=stats)
+        phase_start = record_phase(stats, "preprocess", phase_start)
+        # Weighted search may return a route up to twice the optimal cost
+        min_cost, _ = find_hierarchical_path(hierarchy, 1.0 if strategy == "hierarchical" else 2.0, stats)
+    record_phase(stats, "search", phase_start)
+    stats["min_cost"] = None if min_cost == float('inf') else min_cost
+
+    return stats
+
+
+def run_benchmark(sizes, densities, strategies, seed):
+    results = []
+    costs = ["1", "2", "5"]
+    for size in sizes:
+        for density in densities:
+            route = generate_route(size, size, density, seed)
+            for strategy in strategies:
+                if strategy == "dfs" and size * size > MAX_DFS_CELLS:
+                    continue
+                stats = run_strategy(strategy, route, costs)
+                stats.update({"strategy": strategy, "size": size, "density": density})
+                results.append(stats)
+                print(f"{strategy:<14} {size:>5}x{size:<5} density {density:<5} "
+                      f"cost {str(stats['min_cost']):<7} expanded {stats['nodes_expanded']:<9} "
+                      f"time {stats['phases']['search']:.4f} s")
+
+    return results
+
+
+def compare_with_previous(results, previous_results):
+    # Compare search times with the last recorded run of the same strategy, size and density
+    previous = {(stats["strategy"], stats["size"], stats["density"]): stats for stats in previous_results}
+    for stats in results:
+        old_stats = previous.get((stats["strategy"], stats["size"], stats["density"]))
+        if old_stats is None or not old_stats["phases"]["search"]:
+            continue
+        ratio = stats["phases"]["search"] / old_stats["phases"]["search"]
+        print(f"{stats['strategy']:<14} {stats['size']:>5}x{stats['size']:<5} density {stats['density']:<5} "
+              f"search time x{ratio:.2f} of previous run")
+
+
+def main():
+    _, options = parse_arguments(argv[1:])
+    sizes = [int(size) for size in (options.get("sizes") or "5,7,25,50,100,200").split(",")]
+    densities = [float(density) for density in (options.get("densities") or "0.1,0.3").split(",")]
+    strategies = (options.get("strategies") or "dfs,lpa,hierarchical,weighted").split(",")
+    seed = int(options.get("seed") or 0)
+    history_path = options.get("history") or "benchmark_history.jsonl"
+
+    results = run_benchmark(sizes, densities, strategies, seed)
+
+    # Every run is appended as one JSON line, so the metrics can be followed over time
+    previous_results = []
+    try:
+        with open(history_path, "r") as history:
+            lines = [line for line in history if line.strip()]
+            if lines:
+                previous_results = json.loads(lines[-1])["results"]
+    except FileNotFoundError:
+        pass
+    compare_with_previous(results, previous_results)
+
+    with open(history_path, "a") as history:
+        history.write(json.dumps({"time": time.time(), "seed": seed, "results": results}) + "\n")
+
+
+if __name__ == '__main__':
+    main()
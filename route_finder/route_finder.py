@@ -1,55 +1,112 @@
 from sys import argv
+import array
+import hashlib
+import heapq
+import io
+import json
+import multiprocessing
+import multiprocessing.shared_memory
+import os
+import time
 
 
-def find_costs(route, costs):
+def find_cell_type(route, i, j):
     rows, columns = len(route), len(route[0])
-    # Create a 2D list with all zeros, same as the size of the given route
-    cost_route = [[0 for column in range(columns)] for row in range(rows)]
+    # Sinkholes (0) have no cost, they can not be visited
+    if route[i][j] != 1:
+        return -1
 
-    for i in range(rows):
-        for j in range(columns):
-            # For every 1 in route check neighbors and get its cost
-            if route[i][j] == 1:
-                horizontal_vertical_neighbors = []
-                diagonal_neighbors = []
-
-                # Check all neighbors (vertical, horizontal and diagonal - one hop away)
-                for row_offset in range(-1, 2):
-                    for column_offset in range(-1, 2):
-                        # Skip the current cell
-                        if row_offset == 0 and column_offset == 0:
-                            continue
-
-                        # Get the neighbor's row and column
-                        neighbor_row, neighbor_column = i + row_offset, j + column_offset
-                        # Make sure that neighbor is not over the bounds of the route
-                        if 0 <= neighbor_row < rows and 0 <= neighbor_column < columns:
-                            # Check if it is horizontal and vertical or diagonal neighbor
-                            # it is horizontal or vertical when column or row are the same as of the current cell
-                            if (row_offset == 0 and column_offset != 0) or (row_offset != 0 and column_offset == 0):
-                                horizontal_vertical_neighbors.append(route[neighbor_row][neighbor_column])
-                            else:
-                                diagonal_neighbors.append(route[neighbor_row][neighbor_column])
-
-                # Assign costs according to the neighbors
-                if all(neighbor == 1 for neighbor in horizontal_vertical_neighbors + diagonal_neighbors):
-                    cost_route[i][j] = int(costs[0])
-                elif (
-                        any(neighbor == 0 for neighbor in diagonal_neighbors) and
-                        all(neighbor == 1 for neighbor in horizontal_vertical_neighbors)
-                ):
-                    cost_route[i][j] = int(costs[1])
+    horizontal_vertical_neighbors = []
+    diagonal_neighbors = []
+
+    # Check all neighbors (vertical, horizontal and diagonal - one hop away)
+    for row_offset in range(-1, 2):
+        for column_offset in range(-1, 2):
+            # Skip the current cell
+            if row_offset == 0 and column_offset == 0:
+                continue
+
+            # Get the neighbor's row and column
+            neighbor_row, neighbor_column = i + row_offset, j + column_offset
+            # Make sure that neighbor is not over the bounds of the route
+            if 0 <= neighbor_row < rows and 0 <= neighbor_column < columns:
+                # Check if it is horizontal and vertical or diagonal neighbor
+                # it is horizontal or vertical when column or row are the same as of the current cell
+                if (row_offset == 0 and column_offset != 0) or (row_offset != 0 and column_offset == 0):
+                    horizontal_vertical_neighbors.append(route[neighbor_row][neighbor_column])
                 else:
-                    cost_route[i][j] = int(costs[2])
+                    diagonal_neighbors.append(route[neighbor_row][neighbor_column])
+
+    # Type of the cell is the index of its cost according to the neighbors
+    if all(neighbor == 1 for neighbor in horizontal_vertical_neighbors + diagonal_neighbors):
+        return 0
+    elif (
+            any(neighbor == 0 for neighbor in diagonal_neighbors) and
+            all(neighbor == 1 for neighbor in horizontal_vertical_neighbors)
+    ):
+        return 1
+    else:
+        return 2
+
+
+def find_cell_cost(route, costs, i, j):
+    cell_type = find_cell_type(route, i, j)
+
+    return 0 if cell_type == -1 else int(costs[cell_type])
+
+
+def find_cell_types(route):
+    rows, columns = len(route), len(route[0])
+    # Types only depend on the neighbors, so they can be reused for any costs
+    return [[find_cell_type(route, i, j) for j in range(columns)] for i in range(rows)]
+
+
+def costs_from_types(cell_types, costs):
+    # Assign costs according to the types, sinkholes (-1) stay 0
+    type_costs = [int(costs[0]), int(costs[1]), int(costs[2]), 0]
 
-    return cost_route
+    return [[type_costs[cell_type] for cell_type in row] for row in cell_types]
+
+
+def find_costs(route, costs):
+    return costs_from_types(find_cell_types(route), costs)
+
+
+def update_costs(route, cost_route, costs, changed_cells):
+    rows, columns = len(route), len(route[0])
+    # Cost of a cell only depends on its 3x3 neighborhood, so only the cells around
+    # the changed ones have to be recomputed
+    cells_to_check = set()
+    for i, j in changed_cells:
+        for row_offset in range(-1, 2):
+            for column_offset in range(-1, 2):
+                neighbor_row, neighbor_column = i + row_offset, j + column_offset
+                if 0 <= neighbor_row < rows and 0 <= neighbor_column < columns:
+                    cells_to_check.add((neighbor_row, neighbor_column))
+
+    # Return the cells whose cost has really changed, so the search can be repaired only around them
+    updated_cells = []
+    for i, j in cells_to_check:
+        new_cost = find_cell_cost(route, costs, i, j)
+        if cost_route[i][j] != new_cost:
+            cost_route[i][j] = new_cost
+            updated_cells.append((i, j))
+
+    return cost_route, updated_cells
 
 
 def find_path(cost_route, i, j,
               current_cost, visited_cells, current_path,
-              min_cost, min_cost_path):
+              min_cost, min_cost_path, stats=None):
     rows, columns = len(cost_route), len(cost_route[0])
 
+    # Count the work of the search when statistics are asked for
+    if stats is not None:
+        stats["nodes_expanded"] += 1
+        stats["peak_depth"] = max(stats["peak_depth"], len(current_path))
+        # Recursive search keeps only the cells of the current path, so they are its frontier
+        stats["peak_frontier"] = max(stats["peak_frontier"], len(current_path))
+
     # Base case: Check if rightmost cell has been reached
     if j == columns - 1:
         # Compare new cost and update min_cost and min_cost_path if it is less than previously found
@@ -73,11 +130,14 @@ def find_path(cost_route, i, j,
             current_path.append((i, j + 1))
             min_cost, min_cost_path = find_path(
                 cost_route, i, j + 1, new_cost,
-                visited_cells, current_path, min_cost, min_cost_path
+                visited_cells, current_path, min_cost, min_cost_path, stats
             )
             # After finishing this call remove it from visited cells and current_path
             visited_cells.remove((i, j + 1))
             current_path.pop()
+        elif stats is not None:
+            # Branch is cut, because it can not be cheaper than the best route so far
+            stats["pruned_branches"] += 1
 
     # Same logic is also used for other moves (up, down, left)
     # Check up
@@ -88,10 +148,12 @@ def find_path(cost_route, i, j,
             current_path.append((i - 1, j))
             min_cost, min_cost_path = find_path(
                 cost_route, i - 1, j, new_cost,
-                visited_cells, current_path, min_cost, min_cost_path
+                visited_cells, current_path, min_cost, min_cost_path, stats
             )
             visited_cells.remove((i - 1, j))
             current_path.pop()
+        elif stats is not None:
+            stats["pruned_branches"] += 1
 
     # Check down
     if i + 1 < rows and (i + 1, j) not in visited_cells and cost_route[i + 1][j] != 0:
@@ -101,10 +163,12 @@ def find_path(cost_route, i, j,
             current_path.append((i + 1, j))
             min_cost, min_cost_path = find_path(
                 cost_route, i + 1, j, new_cost,
-                visited_cells, current_path, min_cost, min_cost_path
+                visited_cells, current_path, min_cost, min_cost_path, stats
             )
             visited_cells.remove((i + 1, j))
             current_path.pop()
+        elif stats is not None:
+            stats["pruned_branches"] += 1
 
     # Check left
     if j - 1 >= 0 and (i, j - 1) not in visited_cells and cost_route[i][j - 1] != 0:
@@ -114,80 +178,857 @@ def find_path(cost_route, i, j,
             current_path.append((i, j - 1))
             min_cost, min_cost_path = find_path(
                 cost_route, i, j - 1, new_cost,
-                visited_cells, current_path, min_cost, min_cost_path
+                visited_cells, current_path, min_cost, min_cost_path, stats
             )
             visited_cells.remove((i, j - 1))
             current_path.pop()
+        elif stats is not None:
+            stats["pruned_branches"] += 1
 
     return min_cost, min_cost_path
 
 
-def main():
-    if len(argv) != 3:
-        print("It should be: python route_finder.py <input_file> <output_file>")
+def build_route_hierarchy(cost_route, tile_size=4, stats=None):
+    # The route is split into bands of tile_size rows and every column of a band (a tile of
+    # tile_size x 1 cells) is one node of a smaller abstract graph. Entering a tile costs the
+    # least cost of its cells and moving inside of it costs nothing, so the cheapest route
+    # of the abstract graph from a tile is never more than the one from any of its cells
+    if tile_size < 1:
+        raise ValueError("Tile size should be a positive integer.")
+    rows, columns = len(cost_route), len(cost_route[0])
+    tile_costs = []
+    for first_row in range(0, rows, tile_size):
+        band = cost_route[first_row:first_row + tile_size]
+        # Tiles that only have sinkholes can not be entered
+        tile_costs.append([min(filter(None, column), default=0) for column in zip(*band)])
+
+    # Searching the abstract graph backwards from the rightmost column once gives a lower bound
+    # of the rest of the route from every cell, -1 for the cells that can not reach the end
+    remaining_costs = find_distance_field(tile_costs, columns - 1, stats)
+    flat_tile_costs = [cost for row in tile_costs for cost in row]
+
+    return {
+        "cost_route": cost_route,
+        "tile_size": tile_size,
+        "lower_bounds": [-1 if remaining == -1 else remaining - cost
+                         for remaining, cost in zip(remaining_costs, flat_tile_costs)],
+    }
+
+
+def find_hierarchical_path(hierarchy, weight=1.0, stats=None):
+    # Weighted A* over the cells, guided by the lower bounds of the abstract graph. As the bounds
+    # are never more than the real costs, the route costs at most weight times the optimal one,
+    # so weight 1 gives the optimal route and larger weights search fewer cells
+    if weight < 1:
+        raise ValueError("Weight should be at least 1.")
+    cost_route = hierarchy["cost_route"]
+    tile_size, lower_bounds = hierarchy["tile_size"], hierarchy["lower_bounds"]
+    rows, columns = len(cost_route), len(cost_route[0])
+
+    # Cells are numbered row by row, so the search keeps small integers instead of tuples
+    costs = {}
+    parents = {}
+    queue = []
+    for i in range(rows):
+        lower_bound = lower_bounds[i // tile_size * columns]
+        if cost_route[i][0] != 0 and lower_bound != -1:
+            costs[i * columns] = cost_route[i][0]
+            parents[i * columns] = None
+            # Among cells with the same priority, the ones further along the route are taken first
+            heapq.heappush(queue, (cost_route[i][0] + weight * lower_bound, -cost_route[i][0], i * columns))
+
+    end = None
+    while queue:
+        if stats is not None:
+            stats["peak_frontier"] = max(stats["peak_frontier"], len(queue))
+        _, negative_cost, index = heapq.heappop(queue)
+        # Skip the entries of cells that were reached later with a smaller cost
+        if -negative_cost > costs[index]:
+            if stats is not None:
+                stats["pruned_branches"] += 1
+            continue
+        if stats is not None:
+            stats["nodes_expanded"] += 1
+        i, j = divmod(index, columns)
+        if j == columns - 1:
+            end = index
+            break
+        for neighbor_row, neighbor_column in ((i, j + 1), (i - 1, j), (i + 1, j), (i, j - 1)):
+            if 0 <= neighbor_row < rows and 0 <= neighbor_column < columns \
+                    and cost_route[neighbor_row][neighbor_column] != 0:
+                lower_bound = lower_bounds[neighbor_row // tile_size * columns + neighbor_column]
+                new_cost = -negative_cost + cost_route[neighbor_row][neighbor_column]
+                neighbor = neighbor_row * columns + neighbor_column
+                if lower_bound != -1 and new_cost < costs.get(neighbor, new_cost + 1):
+                    costs[neighbor] = new_cost
+                    parents[neighbor] = index
+                    heapq.heappush(queue, (new_cost + weight * lower_bound, -new_cost, neighbor))
+
+    if end is None:
+        return float('inf'), []
+
+    min_cost_path = []
+    index = end
+    while index is not None:
+        min_cost_path.append(divmod(index, columns))
+        index = parents[index]
+    min_cost_path.reverse()
+
+    return costs[end], min_cost_path
+
+
+# Virtual cell that every rightmost cell leads to, used as the goal of the incremental search
+GOAL = (-1, -1)
+
+
+def create_route_planner(route, costs):
+    # Lifelong Planning A* (LPA*) keeps the costs found by the previous search, so after a
+    # few cells change only the part of the search affected by them has to be repaired
+    cost_route = find_costs(route, costs)
+    positive_costs = [int(cost) for cost in costs if int(cost) > 0]
+
+    planner = {
+        "route": route,
+        "costs": costs,
+        "cost_route": cost_route,
+        # Every move to the right costs at least the smallest cost, so it is a safe heuristic
+        "min_step_cost": min(positive_costs) if positive_costs else 0,
+        "g": {},
+        "rhs": {},
+        "queue": [],
+        "queue_keys": {},
+        "counter": 0,
+        # Rightmost cell with the least cost, the one the goal is reached from
+        "goal_predecessor": None,
+    }
+
+    # Leftmost cells are the starting cells of the search
+    for i in range(len(cost_route)):
+        update_planner_cell(planner, (i, 0))
+
+    return planner
+
+
+def calculate_planner_key(planner, cell):
+    g = planner["g"].get(cell, float('inf'))
+    rhs = planner["rhs"].get(cell, float('inf'))
+    if cell == GOAL:
+        heuristic = 0
+    else:
+        heuristic = (len(planner["cost_route"][0]) - 1 - cell[1]) * planner["min_step_cost"]
+
+    return min(g, rhs) + heuristic, min(g, rhs)
+
+
+def planner_predecessors(planner, cell):
+    cost_route = planner["cost_route"]
+    rows, columns = len(cost_route), len(cost_route[0])
+
+    # Goal can be reached from every rightmost cell
+    if cell == GOAL:
+        return [(i, columns - 1) for i in range(rows)]
+
+    i, j = cell
+    predecessors = []
+    for neighbor_row, neighbor_column in ((i, j - 1), (i - 1, j), (i + 1, j), (i, j + 1)):
+        # Rightmost cells end the route, so the route can not continue from them
+        if 0 <= neighbor_row < rows and 0 <= neighbor_column < columns - 1:
+            predecessors.append((neighbor_row, neighbor_column))
+
+    return predecessors
+
+
+def planner_successors(planner, cell):
+    cost_route = planner["cost_route"]
+    rows, columns = len(cost_route), len(cost_route[0])
+    i, j = cell
+
+    if j == columns - 1:
+        return [GOAL]
+
+    successors = []
+    for neighbor_row, neighbor_column in ((i, j + 1), (i - 1, j), (i + 1, j), (i, j - 1)):
+        if 0 <= neighbor_row < rows and 0 <= neighbor_column < columns:
+            successors.append((neighbor_row, neighbor_column))
+
+    return successors
+
+
+def update_planner_cell(planner, cell, changed_predecessor=None):
+    g, rhs = planner["g"], planner["rhs"]
+    cost_route = planner["cost_route"]
+
+    # rhs is the best cost of reaching the cell by looking one step back from it
+    if cell == GOAL:
+        # Goal can be reached from every rightmost cell, so only the changed one is compared with
+        # the best one. All of them are checked again only when the best one becomes worse
+        best = rhs.get(GOAL, float('inf'))
+        changed_cost = g.get(changed_predecessor, float('inf'))
+        if changed_predecessor is not None and changed_cost < best:
+            best = changed_cost
+            planner["goal_predecessor"] = changed_predecessor
+        elif changed_predecessor is None or \
+                (changed_predecessor == planner["goal_predecessor"] and changed_cost > best):
+            planner["goal_predecessor"] = min(planner_predecessors(planner, GOAL), key=lambda c: g.get(c, float('inf')))
+            best = g.get(planner["goal_predecessor"], float('inf'))
+    elif cost_route[cell[0]][cell[1]] == 0:
+        best = float('inf')
+    else:
+        cell_cost = cost_route[cell[0]][cell[1]]
+        # Leftmost cells can also be the start of the route
+        best = cell_cost if cell[1] == 0 else float('inf')
+        for predecessor in planner_predecessors(planner, cell):
+            best = min(best, g.get(predecessor, float('inf')) + cell_cost)
+    rhs[cell] = best
+
+    # Only inconsistent cells have to be in the queue, older entries of the cell are skipped when popped
+    if g.get(cell, float('inf')) != best:
+        key = calculate_planner_key(planner, cell)
+        planner["queue_keys"][cell] = key
+        planner["counter"] += 1
+        heapq.heappush(planner["queue"], (key, planner["counter"], cell))
+    else:
+        planner["queue_keys"].pop(cell, None)
+
+
+def compute_planner_path(planner, stats=None):
+    g, rhs = planner["g"], planner["rhs"]
+    queue, queue_keys = planner["queue"], planner["queue_keys"]
+
+    while queue:
+        if stats is not None:
+            stats["peak_frontier"] = max(stats["peak_frontier"], len(queue))
+        key, _, cell = queue[0]
+        # Skip the entries that were replaced by a newer key
+        if queue_keys.get(cell) != key:
+            heapq.heappop(queue)
+            if stats is not None:
+                stats["pruned_branches"] += 1
+            continue
+        # Stop when the goal is consistent and no cell in the queue can change it
+        # (cells with the same key are still processed, because moving to the goal costs nothing)
+        if key > calculate_planner_key(planner, GOAL) and \
+                g.get(GOAL, float('inf')) == rhs.get(GOAL, float('inf')):
+            break
+
+        heapq.heappop(queue)
+        del queue_keys[cell]
+        if stats is not None:
+            stats["nodes_expanded"] += 1
+        if g.get(cell, float('inf')) > rhs.get(cell, float('inf')):
+            g[cell] = rhs[cell]
+        else:
+            g[cell] = float('inf')
+            update_planner_cell(planner, cell)
+        for successor in planner_successors(planner, cell):
+            update_planner_cell(planner, successor, cell)
+
+    min_cost = g.get(GOAL, float('inf'))
+    if min_cost == float('inf'):
+        return min_cost, []
+
+    # Walk back from the goal, every time choosing the cell that leads to the current one with the least cost
+    cost_route = planner["cost_route"]
+    cell = planner["goal_predecessor"]
+    min_cost_path = [cell]
+    while True:
+        cell_cost = cost_route[cell[0]][cell[1]]
+        predecessor = min(planner_predecessors(planner, cell), key=lambda c: g.get(c, float('inf')), default=None)
+        # Stop when starting from the current leftmost cell is not worse than coming from another cell
+        if predecessor is None or (
+                cell[1] == 0 and cell_cost <= g.get(predecessor, float('inf')) + cell_cost
+        ):
+            break
+        cell = predecessor
+        min_cost_path.append(cell)
+    min_cost_path.reverse()
+
+    return min_cost, min_cost_path
+
+
+def update_route_planner(planner, changed_cells):
+    # changed_cells maps (row, column) to the new value of the cell (0 for sinkhole, 1 otherwise)
+    route = planner["route"]
+    check_route_cells(route, changed_cells)
+    for (i, j), value in changed_cells.items():
+        route[i][j] = value
+
+    # Recompute costs only around the changed cells and repair the search only where costs changed
+    _, updated_cells = update_costs(route, planner["cost_route"], planner["costs"], changed_cells)
+    for cell in updated_cells:
+        update_planner_cell(planner, cell)
+
+    return planner
+
+
+def find_distance_field(cost_route, target_column, stats=None):
+    rows, columns = len(cost_route), len(cost_route[0])
+    # Cost of the cheapest route from every cell to the target column (including the cell itself),
+    # stored row by row in a flat list with -1 for the cells that can not reach it
+    distances = [-1] * (rows * columns)
+    queue = []
+    for i in range(rows):
+        if cost_route[i][target_column] != 0:
+            distances[i * columns + target_column] = cost_route[i][target_column]
+            queue.append((cost_route[i][target_column], i, target_column))
+    heapq.heapify(queue)
+
+    # Dijkstra's algorithm backwards from the target column
+    while queue:
+        if stats is not None:
+            stats["peak_frontier"] = max(stats["peak_frontier"], len(queue))
+        distance, i, j = heapq.heappop(queue)
+        if distance > distances[i * columns + j]:
+            if stats is not None:
+                stats["pruned_branches"] += 1
+            continue
+        if stats is not None:
+            stats["nodes_expanded"] += 1
+        for neighbor_row, neighbor_column in ((i, j - 1), (i - 1, j), (i + 1, j), (i, j + 1)):
+            # Route ends as soon as it reaches the target column, so it can not come from there
+            if 0 <= neighbor_row < rows and 0 <= neighbor_column < target_column \
+                    and cost_route[neighbor_row][neighbor_column] != 0:
+                new_distance = distance + cost_route[neighbor_row][neighbor_column]
+                index = neighbor_row * columns + neighbor_column
+                if distances[index] == -1 or new_distance < distances[index]:
+                    distances[index] = new_distance
+                    heapq.heappush(queue, (new_distance, neighbor_row, neighbor_column))
+
+    return distances
+
+
+def walk_distance_field(flat_costs, distances, columns, start_row, target_column):
+    rows = len(distances) // columns
+    if distances[start_row * columns] == -1:
+        return float('inf'), []
+
+    # Every step goes to the neighbor whose distance is exactly the rest of the route
+    i, j = start_row, 0
+    min_cost_path = [(i, j)]
+    while j != target_column:
+        remaining = distances[i * columns + j] - flat_costs[i * columns + j]
+        for neighbor_row, neighbor_column in ((i, j + 1), (i - 1, j), (i + 1, j), (i, j - 1)):
+            if 0 <= neighbor_row < rows and 0 <= neighbor_column <= target_column \
+                    and distances[neighbor_row * columns + neighbor_column] == remaining:
+                i, j = neighbor_row, neighbor_column
+                break
+        min_cost_path.append((i, j))
+
+    return distances[start_row * columns], min_cost_path
+
+
+def check_route_cells(route, cells):
+    # Negative indexes would silently wrap around to the other side of the route
+    rows, columns = len(route), len(route[0])
+    for i, j in cells:
+        if not (0 <= i < rows and 0 <= j < columns):
+            raise ValueError(f"Cell ({i}, {j}) is outside the route.")
+
+
+def create_route_queries(route, costs):
+    cost_route = find_costs(route, costs)
+
+    return {
+        "route": route,
+        "costs": costs,
+        "cost_route": cost_route,
+        "flat_costs": [cost for row in cost_route for cost in row],
+        # Distance fields by target column, they are removed whenever the route changes
+        "fields": {},
+        # Worker processes and shared memory of query_routes_parallel, kept until close_route_queries
+        "pool": None,
+        "workers": None,
+        "shared": None,
+    }
+
+
+def update_route_queries(queries, changed_cells):
+    # changed_cells maps (row, column) to the new value of the cell (0 for sinkhole, 1 otherwise)
+    route, cost_route = queries["route"], queries["cost_route"]
+    check_route_cells(route, changed_cells)
+    for (i, j), value in changed_cells.items():
+        route[i][j] = value
+
+    _, updated_cells = update_costs(route, cost_route, queries["costs"], changed_cells)
+    if updated_cells:
+        columns = len(cost_route[0])
+        for i, j in updated_cells:
+            queries["flat_costs"][i * columns + j] = cost_route[i][j]
+        queries["fields"].clear()
+        # Workers keep reading the same shared memory, so it is refreshed in place
+        if queries["shared"] is not None:
+            write_shared_route(queries)
+
+    return queries
+
+
+def find_query_field(queries, target_column=None):
+    if target_column is None:
+        target_column = len(queries["cost_route"][0]) - 1
+    if target_column not in queries["fields"]:
+        queries["fields"][target_column] = find_distance_field(queries["cost_route"], target_column)
+
+    return queries["fields"][target_column]
+
+
+def check_route_query(queries, start_row, target_column):
+    rows, columns = len(queries["cost_route"]), len(queries["cost_route"][0])
+    if not 0 <= start_row < rows:
+        raise ValueError(f"Start row {start_row} is outside the route.")
+    if not 0 <= target_column < columns:
+        raise ValueError(f"Target column {target_column} is outside the route.")
+
+
+def query_route(queries, start_row, target_column=None):
+    # Route from a leftmost cell to the target column (rightmost column by default)
+    if target_column is None:
+        target_column = len(queries["cost_route"][0]) - 1
+    check_route_query(queries, start_row, target_column)
+    distances = find_query_field(queries, target_column)
+
+    return walk_distance_field(queries["flat_costs"], distances, len(queries["cost_route"][0]),
+                               start_row, target_column)
+
+
+def query_all_costs(queries, target_column=None):
+    # Cost of the cheapest route from every leftmost cell, inf if there is none
+    distances = find_query_field(queries, target_column)
+    columns = len(queries["cost_route"][0])
+
+    return [float('inf') if distances[i * columns] == -1 else distances[i * columns]
+            for i in range(len(queries["cost_route"]))]
+
+
+# Shared memory that a worker process of query_routes_parallel has attached to
+shared_route = {}
+
+
+def write_shared_route(queries):
+    # First block of the shared memory has the costs, then one distance field for every target column
+    shared = queries["shared"]
+    size = len(queries["flat_costs"])
+    view = shared["memory"].buf.cast("q")
+    view[:size] = array.array("q", queries["flat_costs"])
+    for field_index, target_column in enumerate(shared["target_columns"], 1):
+        view[field_index * size:(field_index + 1) * size] = \
+            array.array("q", find_query_field(queries, target_column))
+    view.release()
+
+
+def share_route(queries, target_columns):
+    # Costs and distance fields are copied into shared memory, so workers read them without
+    # getting their own copy of the route. A larger block is made only when a target column
+    # is not in the current one
+    shared = queries["shared"]
+    if shared is not None and set(target_columns) <= set(shared["target_columns"]):
+        return shared
+    if shared is not None:
+        target_columns = sorted(set(target_columns) | set(shared["target_columns"]))
+        shared["memory"].close()
+        shared["memory"].unlink()
+    size = len(queries["flat_costs"])
+    memory = multiprocessing.shared_memory.SharedMemory(create=True, size=8 * size * (len(target_columns) + 1))
+    queries["shared"] = {"memory": memory, "target_columns": target_columns}
+    write_shared_route(queries)
+
+    return queries["shared"]
+
+
+def answer_shared_queries(task):
+    name, columns, target_columns, route_queries = task
+    # Workers attach to the shared memory once and again only when a new block is made
+    if shared_route.get("name") != name:
+        if "memory" in shared_route:
+            shared_route["view"].release()
+            shared_route["memory"].close()
+        shared_route["memory"] = multiprocessing.shared_memory.SharedMemory(name=name)
+        shared_route["view"] = shared_route["memory"].buf.cast("q")
+        shared_route["name"] = name
+    view = shared_route["view"]
+    size = len(view) // (len(target_columns) + 1)
+
+    results = []
+    for start_row, target_column in route_queries:
+        field_index = target_columns.index(target_column) + 1
+        results.append(walk_distance_field(view[:size], view[field_index * size:(field_index + 1) * size],
+                                           columns, start_row, target_column))
+
+    return results
+
+
+def query_routes_parallel(queries, route_queries, workers=None):
+    # route_queries is a list of (start_row, target_column) pairs, target_column may be None
+    columns = len(queries["cost_route"][0])
+    route_queries = [(start_row, columns - 1 if target_column is None else target_column)
+                     for start_row, target_column in route_queries]
+    for start_row, target_column in route_queries:
+        check_route_query(queries, start_row, target_column)
+
+    workers = workers or os.cpu_count() or 1
+    if workers == 1:
+        # One worker would only add the cost of sending the queries and routes between processes
+        return [query_route(queries, start_row, target_column) for start_row, target_column in route_queries]
+
+    # Workers are started by the first call and reused by the next ones
+    shared = share_route(queries, sorted({target_column for _, target_column in route_queries}))
+    if queries["pool"] is None or queries["workers"] != workers:
+        if queries["pool"] is not None:
+            queries["pool"].terminate()
+        queries["pool"], queries["workers"] = multiprocessing.Pool(workers), workers
+
+    # Queries are sent in a few large chunks, so the cost of sending them stays small
+    chunk_size = max(1, -(-len(route_queries) // (workers * 4)))
+    tasks = [(shared["memory"].name, columns, shared["target_columns"], route_queries[index:index + chunk_size])
+             for index in range(0, len(route_queries), chunk_size)]
+
+    return [result for results in queries["pool"].map(answer_shared_queries, tasks) for result in results]
+
+
+def close_route_queries(queries):
+    # Stop the workers and free the shared memory of query_routes_parallel
+    if queries["pool"] is not None:
+        queries["pool"].terminate()
+        queries["pool"].join()
+        queries["pool"], queries["workers"] = None, None
+    if queries["shared"] is not None:
+        queries["shared"]["memory"].close()
+        queries["shared"]["memory"].unlink()
+        queries["shared"] = None
+
+
+def read_route(file_input):
+    # Check if input is empty
+    if not file_input.readlines():
+        raise ValueError("Input file is empty")
+
+    file_input.seek(0)
+
+    # Check if number of costs is not less or bigger than 3
+    costs = file_input.readline().strip().split(" ")
+    if len(costs) != 3:
+        raise ValueError("There should be exactly 3 positive integers that represent costs.")
+
+    route = []
+    for line in file_input:
+        route.append([int(x) for x in line.split()])
+    # Make sure all rows have the same length
+    row_length = len(route[0])
+    if not all(len(row) == row_length for row in route):
+        raise ValueError("All rows in the input file should have the same length.")
+
+    return costs, route
+
+
+def search_route(route_with_costs, stats=None):
+    min_cost = float('inf')
+    min_cost_path = []
+
+    # Check path for every first leftmost row
+    for i in range(len(route_with_costs)):
+        # Make sure it is not a sinkhole (0)
+        if route_with_costs[i][0] != 0:
+            visited_cells = [(i, 0)]
+            current_path = [(i, 0)]
+            min_cost, min_cost_path = find_path(
+                route_with_costs, i, 0, route_with_costs[i][0],
+                visited_cells, current_path, min_cost, min_cost_path, stats
+            )
+
+    return min_cost, min_cost_path
+
+
+def write_route(output_file, route, min_cost, min_cost_path):
+    if min_cost == float('inf'):
+        output_file.write("There is no possible route!")
         return
 
+    # Set of the path cells makes checking every cell of the route fast
+    path_cells = set(min_cost_path)
+    output_file.write(f"Cost of the route: {min_cost}\n")
+    for i in range(len(route)):
+        # Mark the shortest path with "X"
+        output_file.write(" ".join(
+            "X" if (i, j) in path_cells else f"{route[i][j]}" for j in range(len(route[i]))
+        ))
+        if i < len(route) - 1:
+            output_file.write("\n")
+
+
+def cache_key(*parts):
+    return hashlib.sha256("\n".join(parts).encode()).hexdigest()
+
+
+def read_cache(cache_directory, kind, key):
+    path = os.path.join(cache_directory, kind, key + ".json")
     try:
-        with open(argv[1], "r") as file_input:
-            # Check if input is empty
-            if not file_input.readlines():
-                print("Input file is empty")
-                return
-
-            file_input.seek(0)
-
-            # Check if number of costs is not less or bigger than 3
-            try:
-                costs = file_input.readline().strip().split(" ")
-                if len(costs) != 3:
-                    raise ValueError("There should be exactly 3 positive integers that represent costs.")
-            except ValueError as e:
-                print(e)
-                return
-
-            try:
-                route = []
-                for line in file_input:
-                    route.append([int(x) for x in line.split()])
-                # Make sure all rows have the same length
-                row_length = len(route[0])
-                if not all(len(row) == row_length for row in route):
-                    raise ValueError("All rows in the input file should have the same length.")
-            except ValueError as e:
-                print(e)
-                return
-
-            route_with_costs = find_costs(route, costs)
-            min_cost = float('inf')
-            min_cost_path = []
-
-            # Check path for every first leftmost row
-            for i in range(len(route_with_costs)):
-                # Make sure it is not a sinkhole (0)
-                if route_with_costs[i][0] != 0:
-                    visited_cells = [(i, 0)]
-                    current_path = [(i, 0)]
-                    min_cost, min_cost_path = find_path(
-                        route_with_costs, i, 0, route_with_costs[i][0],
-                        visited_cells, current_path, min_cost, min_cost_path
-                    )
-
-            with open(argv[2], "w") as output_file:
-                if min_cost == float('inf'):
-                    output_file.write("There is no possible route!")
-                else:
-                    output_file.write(f"Cost of the route: {min_cost}\n")
-                    for i in range(len(route)):
-                        for j in range(len(route[i])):
-                            # Mark the shortest path with "X"
-                            if (i, j) in min_cost_path:
-                                route[i][j] = 'X'
-                            output_file.write(f"{route[i][j]}")
-                            if j < len(route[i]) - 1:
-                                output_file.write(" ")
-                        if i < len(route) - 1:
-                            output_file.write("\n")
+        with open(path, "r") as cache_file:
+            value = json.load(cache_file)
+        # Modification time marks the last use of the entry for the LRU eviction
+        os.utime(path)
+    except (FileNotFoundError, ValueError):
+        return None
 
+    return value
+
+
+def read_cache_size(cache_directory):
+    try:
+        with open(os.path.join(cache_directory, "size"), "r") as size_file:
+            return int(size_file.read())
+    except (FileNotFoundError, ValueError):
+        return None
+
+
+def write_cache_size(cache_directory, total_size):
+    path = os.path.join(cache_directory, "size")
+    temporary_path = f"{path}.{os.getpid()}.tmp"
+    with open(temporary_path, "w") as size_file:
+        size_file.write(str(total_size))
+    os.replace(temporary_path, path)
+
+
+def evict_cache(cache_directory, max_size):
+    # Remove the least recently used entries when the cache is over its size. It is emptied
+    # to three quarters of its size, so the next scan of the cache comes only after many writes
+    entries = []
+    for entry_kind in os.listdir(cache_directory):
+        kind_directory = os.path.join(cache_directory, entry_kind)
+        if os.path.isdir(kind_directory):
+            for name in os.listdir(kind_directory):
+                try:
+                    stat = os.stat(os.path.join(kind_directory, name))
+                except FileNotFoundError:
+                    continue
+                entries.append((stat.st_mtime, stat.st_size, os.path.join(kind_directory, name)))
+    total_size = sum(size for _, size, _ in entries)
+    if total_size <= max_size:
+        return total_size
+    for _, size, entry_path in sorted(entries):
+        if total_size <= max_size * 3 // 4:
+            break
+        try:
+            os.remove(entry_path)
+        except FileNotFoundError:
+            pass
+        total_size -= size
+
+    return total_size
+
+
+def write_cache(cache_directory, kind, key, value, max_size):
+    os.makedirs(os.path.join(cache_directory, kind), exist_ok=True)
+    path = os.path.join(cache_directory, kind, key + ".json")
+    try:
+        old_size = os.stat(path).st_size
+    except FileNotFoundError:
+        old_size = 0
+    # Write to a temporary file first, so other processes never read a half written entry
+    temporary_path = f"{path}.{os.getpid()}.tmp"
+    with open(temporary_path, "w") as cache_file:
+        json.dump(value, cache_file)
+    new_size = os.stat(temporary_path).st_size
+    os.replace(temporary_path, path)
+
+    # Total size of the entries is kept in a file and updated by every write, so the cache
+    # is scanned only when it is over its size or the total is not known. Writes of other
+    # processes at the same time may be missed, the next scan corrects the total
+    total_size = read_cache_size(cache_directory)
+    if total_size is not None:
+        total_size += new_size - old_size
+    if total_size is None or total_size > max_size:
+        total_size = evict_cache(cache_directory, max_size)
+    write_cache_size(cache_directory, total_size)
+
+
+def new_search_stats():
+    return {
+        "nodes_expanded": 0,
+        "pruned_branches": 0,
+        "peak_frontier": 0,
+        "peak_depth": 0,
+        "phases": {},
+    }
+
+
+def record_phase(stats, phase, start_time):
+    # Add the time since start_time to the phase and return the current time for the next phase
+    now = time.perf_counter()
+    if stats is not None:
+        stats["phases"][phase] = stats["phases"].get(phase, 0) + now - start_time
+
+    return now
+
+
+def solve_route(input_path, output_path, options, stats=None):
+    phase_start = time.perf_counter()
+    with open(input_path, "r") as file_input:
+        text = file_input.read()
+
+    cache_directory = options.get("cache")
+    if cache_directory:
+        max_size = int(options.get("cache-size") or 256 * 1024 * 1024)
+        # Route result depends on the costs, the route and how it is searched
+        cost_line, _, grid = text.partition("\n")
+        search_options = " ".join(
+            f"{name}={options[name]}" for name in ("hierarchical", "tile-size", "weight") if name in options
+        )
+        grid_key = cache_key(grid)
+        route_key = cache_key(" ".join(cost_line.strip().split(" ")), search_options, grid)
+
+        cached_route = read_cache(cache_directory, "routes", route_key)
+        if cached_route is not None:
+            with open(output_path, "w") as output_file:
+                output_file.write(cached_route["output"])
+            record_phase(stats, "cache", phase_start)
+            return float('inf') if cached_route["min_cost"] is None else cached_route["min_cost"]
+
+    costs, route = read_route(io.StringIO(text))
+    phase_start = record_phase(stats, "parse", phase_start)
+
+    # Types of the cells do not depend on the costs, so they are cached only by the route
+    cell_types = read_cache(cache_directory, "types", grid_key) if cache_directory else None
+    if cell_types is None:
+        cell_types = find_cell_types(route)
+        if cache_directory:
+            write_cache(cache_directory, "types", grid_key, cell_types, max_size)
+    route_with_costs = costs_from_types(cell_types, costs)
+    phase_start = record_phase(stats, "find_costs", phase_start)
+
+    if "hierarchical" in options:
+        # Work of the preprocessing search is counted together with the work of the route search
+        hierarchy = build_route_hierarchy(route_with_costs, int(options.get("tile-size") or 4), stats)
+        phase_start = record_phase(stats, "preprocess", phase_start)
+        min_cost, min_cost_path = find_hierarchical_path(hierarchy, float(options.get("weight") or 1), stats)
+    else:
+        min_cost, min_cost_path = search_route(route_with_costs, stats)
+    phase_start = record_phase(stats, "search", phase_start)
+
+    output = io.StringIO()
+    write_route(output, route, min_cost, min_cost_path)
+    with open(output_path, "w") as output_file:
+        output_file.write(output.getvalue())
+    record_phase(stats, "render", phase_start)
+
+    if cache_directory:
+        write_cache(cache_directory, "routes", route_key, {
+            "min_cost": None if min_cost == float('inf') else min_cost,
+            "output": output.getvalue(),
+        }, max_size)
+
+    return min_cost
+
+
+def solve_batch_item(item):
+    input_path, output_path, options = item
+    start_time = time.perf_counter()
+    # Failures are returned instead of raised, so one bad file does not stop the whole batch
+    try:
+        min_cost = solve_route(input_path, output_path, options)
+        result = "No possible route" if min_cost == float('inf') else f"Cost {min_cost}"
+        failed = False
+    except FileNotFoundError:
+        result, failed = "Input file not found", True
+    except Exception as e:
+        result, failed = f"{type(e).__name__}: {e}", True
+
+    return input_path, output_path, failed, result, time.perf_counter() - start_time
+
+
+def read_batch_items(source, output_directory, options):
+    items = []
+    if os.path.isdir(source):
+        # Every file of the directory is solved into a file with the same name
+        for name in sorted(os.listdir(source)):
+            if os.path.isfile(os.path.join(source, name)):
+                items.append((os.path.join(source, name), os.path.join(output_directory, name), options))
+    else:
+        # Manifest has one "<input_file> <output_file>" pair per line
+        with open(source, "r") as manifest:
+            for line in manifest:
+                if not line.strip():
+                    continue
+                pair = line.split()
+                if len(pair) != 2:
+                    raise ValueError(f"Invalid manifest line: {line.strip()}")
+                items.append((pair[0], os.path.join(output_directory, pair[1]), options))
+
+    return items
+
+
+def solve_batch(source, output_directory, options):
+    items = read_batch_items(source, output_directory, options)
+    os.makedirs(output_directory, exist_ok=True)
+    workers = int(options.get("workers") or os.cpu_count() or 1)
+    report_path = options.get("report") or os.path.join(output_directory, "batch_report.txt")
+
+    start_time = time.perf_counter()
+    results = []
+    # Workers are started once and reused for every file, so interpreter startup is paid only once per worker
+    with multiprocessing.Pool(workers) as pool:
+        chunk_size = max(1, len(items) // (workers * 16))
+        for result in pool.imap_unordered(solve_batch_item, items, chunk_size):
+            results.append(result)
+            input_path, _, failed, message, _ = result
+            print(f"[{len(results)}/{len(items)}] {input_path}: {'FAILED ' if failed else ''}{message}")
+    elapsed_time = time.perf_counter() - start_time
+
+    failures = [result for result in results if result[2]]
+    with open(report_path, "w") as report:
+        report.write(f"Solved: {len(results) - len(failures)}\n")
+        report.write(f"Failed: {len(failures)}\n")
+        report.write(f"Workers: {workers}\n")
+        report.write(f"Time: {elapsed_time:.2f} s\n")
+        if failures:
+            report.write("Failures:\n")
+            for input_path, _, _, message, _ in sorted(failures):
+                report.write(f"{input_path}: {message}\n")
+        report.write("Results:\n")
+        for input_path, output_path, failed, message, seconds in sorted(results):
+            report.write(f"{input_path} -> {output_path}: {message} ({seconds:.3f} s)\n")
+
+    return results
+
+
+def parse_arguments(arguments):
+    # Options are given as --name or --name=value, everything else is a file name
+    files = [argument for argument in arguments if not argument.startswith("--")]
+    options = {}
+    for argument in arguments:
+        if argument.startswith("--"):
+            name, _, value = argument[2:].partition("=")
+            options[name] = value
+
+    return files, options
+
+
+def main():
+    files, options = parse_arguments(argv[1:])
+    if len(files) != 2:
+        print("It should be: python route_finder.py <input_file> <output_file> "
+              "[--hierarchical] [--tile-size=N] [--weight=W] "
+              "[--cache=DIRECTORY] [--cache-size=BYTES] [--stats[=FILE]]\n"
+              "or: python route_finder.py --batch <input_directory_or_manifest> <output_directory> "
+              "[--workers=N] [--report=FILE]")
+        return
+
+    try:
+        if "batch" in options:
+            solve_batch(files[0], files[1], options)
+        elif "stats" in options:
+            stats = new_search_stats()
+            min_cost = solve_route(files[0], files[1], options, stats)
+            stats["min_cost"] = None if min_cost == float('inf') else min_cost
+            # Statistics are written as JSON to the given file, or printed when no file is given
+            if options["stats"]:
+                with open(options["stats"], "w") as stats_file:
+                    json.dump(stats, stats_file, indent=4)
+            else:
+                print(json.dumps(stats, indent=4))
+        else:
+            solve_route(files[0], files[1], options)
+    except ValueError as e:
+        print(e)
+        return
     except FileNotFoundError:
         print("Input file not found")
         return
@@ -197,4 +1038,4 @@ def main():
 
 
 if __name__ == '__main__':
-   main()
\ No newline at end of file
+   main()
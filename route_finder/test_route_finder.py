@@ -0,0 +1,138 @@
+import random
+
+import pytest
+
+from route_finder import (
+    build_route_hierarchy, close_route_queries, compute_planner_path, create_route_planner, create_route_queries,
+    find_costs, find_hierarchical_path, find_path, query_all_costs, query_route, query_routes_parallel,
+    search_route, update_route_planner, update_route_queries
+)
+
+
+COSTS = ["1", "2", "5"]
+# Recursive search visits every possible route, so the routes are kept small
+SEEDS = range(300)
+
+
+def random_route(generator):
+    rows, columns = generator.randint(1, 6), generator.randint(1, 6)
+    density = generator.choice([0.1, 0.2, 0.3, 0.5])
+
+    return [[0 if generator.random() < density else 1 for _ in range(columns)] for _ in range(rows)]
+
+
+def random_changes(generator, route):
+    rows, columns = len(route), len(route[0])
+    return {(generator.randrange(rows), generator.randrange(columns)): generator.choice([0, 1])
+            for _ in range(generator.randint(1, 3))}
+
+
+def row_cost(cost_route, i, target_column):
+    # Cheapest route from one leftmost cell found by the recursive search on the columns up to the target
+    if cost_route[i][0] == 0:
+        return float('inf')
+    columns = [row[:target_column + 1] for row in cost_route]
+    min_cost, _ = find_path(columns, i, 0, columns[i][0], [(i, 0)], [(i, 0)], float('inf'), [])
+    return min_cost
+
+
+def assert_valid_path(cost_route, min_cost, min_cost_path, target_column=None):
+    if min_cost == float('inf'):
+        assert min_cost_path == []
+        return
+    if target_column is None:
+        target_column = len(cost_route[0]) - 1
+    rows, columns = len(cost_route), len(cost_route[0])
+    assert min_cost_path[0][1] == 0
+    assert min_cost_path[-1][1] == target_column
+    # Route ends as soon as it reaches the target column
+    assert all(j != target_column for _, j in min_cost_path[:-1])
+    assert len(set(min_cost_path)) == len(min_cost_path)
+    for (i, j), (next_i, next_j) in zip(min_cost_path, min_cost_path[1:]):
+        assert abs(i - next_i) + abs(j - next_j) == 1
+    assert all(0 <= i < rows and 0 <= j < columns and cost_route[i][j] != 0 for i, j in min_cost_path)
+    assert sum(cost_route[i][j] for i, j in min_cost_path) == min_cost
+
+
+@pytest.mark.parametrize("seed", SEEDS)
+def test_planner_matches_search_after_updates(seed):
+    generator = random.Random(seed)
+    route = random_route(generator)
+    planner = create_route_planner([row[:] for row in route], COSTS)
+    for _ in range(5):
+        cost_route = find_costs(route, COSTS)
+        min_cost, min_cost_path = compute_planner_path(planner)
+        assert min_cost == search_route(cost_route)[0]
+        assert_valid_path(cost_route, min_cost, min_cost_path)
+
+        changes = random_changes(generator, route)
+        for (i, j), value in changes.items():
+            route[i][j] = value
+        update_route_planner(planner, changes)
+
+
+@pytest.mark.parametrize("seed", SEEDS)
+def test_hierarchy_cost_is_within_weight(seed):
+    generator = random.Random(seed)
+    cost_route = find_costs(random_route(generator), COSTS)
+    optimal_cost, _ = search_route(cost_route)
+    hierarchy = build_route_hierarchy(cost_route, generator.randint(1, 4))
+
+    min_cost, min_cost_path = find_hierarchical_path(hierarchy)
+    assert min_cost == optimal_cost
+    assert_valid_path(cost_route, min_cost, min_cost_path)
+
+    for weight in (1.5, 3.0):
+        min_cost, min_cost_path = find_hierarchical_path(hierarchy, weight)
+        assert min_cost == optimal_cost or optimal_cost <= min_cost <= weight * optimal_cost
+        assert_valid_path(cost_route, min_cost, min_cost_path)
+
+
+@pytest.mark.parametrize("seed", SEEDS)
+def test_queries_match_search_after_updates(seed):
+    generator = random.Random(seed)
+    route = random_route(generator)
+    queries = create_route_queries([row[:] for row in route], COSTS)
+    for _ in range(3):
+        cost_route = find_costs(route, COSTS)
+        target_column = generator.randrange(len(route[0]))
+        all_costs = query_all_costs(queries, target_column)
+        for i in range(len(route)):
+            min_cost, min_cost_path = query_route(queries, i, target_column)
+            assert min_cost == all_costs[i] == row_cost(cost_route, i, target_column)
+            assert_valid_path(cost_route, min_cost, min_cost_path, target_column)
+
+        changes = random_changes(generator, route)
+        for (i, j), value in changes.items():
+            route[i][j] = value
+        update_route_queries(queries, changes)
+
+
+def test_parallel_queries_match_queries():
+    generator = random.Random(0)
+    route = [[0 if generator.random() < 0.2 else 1 for _ in range(30)] for _ in range(20)]
+    queries = create_route_queries(route, COSTS)
+    route_queries = [(generator.randrange(20), generator.choice([None, 10, 29])) for _ in range(50)]
+    try:
+        for _ in range(2):
+            expected = [query_route(queries, start_row, target_column) for start_row, target_column in route_queries]
+            assert query_routes_parallel(queries, route_queries, workers=2) == expected
+            update_route_queries(queries, {(5, 5): 0, (10, 20): 0})
+    finally:
+        close_route_queries(queries)
+
+
+def test_cells_outside_route_are_rejected():
+    route = [[1, 1, 1], [1, 1, 1]]
+    planner = create_route_planner([row[:] for row in route], COSTS)
+    queries = create_route_queries([row[:] for row in route], COSTS)
+    for cell in ((-1, 0), (0, -1), (2, 0), (0, 3)):
+        with pytest.raises(ValueError):
+            update_route_planner(planner, {cell: 0})
+        with pytest.raises(ValueError):
+            update_route_queries(queries, {cell: 0})
+    for start_row in (-1, 2):
+        with pytest.raises(ValueError):
+            query_route(queries, start_row)
+    # Rejected changes leave the route as it was
+    assert planner["route"] == route and queries["route"] == route
@@ -0,0 +1,109 @@
+from sys import argv, platform
+import json
+import multiprocessing
+import os
+import random
+import resource
+import tempfile
+import time
+
+from text_analyzer import count_file, new_profile, parse_arguments, summarize_counts
+
+
+# Generated text is written in blocks of this many words
+WORDS_PER_BLOCK = 10000
+
+
+def generate_text(output_path, size, seed):
+    # Word frequencies follow Zipf's law like in natural text, sentences end every 15 words
+    generator = random.Random(seed)
+    vocabulary = ["".join(generator.choice("abcdefghijklmnopqrstuvwxyz") for _ in range(generator.randint(1, 12)))
+                  for _ in range(50000)]
+    weights = [1 / rank for rank in range(1, len(vocabulary) + 1)]
+    written = 0
+    with open(output_path, "w") as output:
+        while written < size:
+            words = generator.choices(vocabulary, weights, k=WORDS_PER_BLOCK)
+            for index in range(0, len(words), 15):
+                words[index] = words[index].capitalize()
+                words[index - 1] += generator.choice(".!?")
+            block = " ".join(words) + "\n"
+            output.write(block)
+            written += len(block)
+
+
+def measure_file(input_path):
+    # Runs in a fresh process, so the peak memory of one file does not hide the others
+    profile = new_profile()
+    start_time = time.perf_counter()
+    summarize_counts(count_file(input_path, profile=profile))
+    seconds = time.perf_counter() - start_time
+    # Peak resident memory is in bytes on macOS and in kilobytes on Linux and other systems
+    peak_memory = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    if platform != "darwin":
+        peak_memory *= 1024
+
+    return {
+        "seconds": seconds,
+        "stages": {name: stage["seconds"] for name, stage in profile["stages"].items()},
+        "peak_memory": peak_memory,
+    }
+
+
+def run_benchmark(inputs):
+    results = []
+    context = multiprocessing.get_context("spawn")
+    for name, input_path in inputs:
+        with context.Pool(1) as pool:
+            stats = pool.apply(measure_file, (input_path,))
+        size = os.path.getsize(input_path)
+        stats.update({"input": name, "bytes": size, "throughput": size / stats["seconds"]})
+        results.append(stats)
+        print(f"{name:<24} {size / 1024 / 1024:>9.1f} MB {stats['throughput'] / 1024 / 1024:>8.2f} MB/s "
+              f"peak memory {stats['peak_memory'] / 1024 / 1024:.1f} MB")
+
+    return results
+
+
+def compare_with_baseline(results, baseline_results):
+    # Compare throughput and peak memory with the baseline run of the same input
+    baseline = {stats["input"]: stats for stats in baseline_results}
+    for stats in results:
+        old_stats = baseline.get(stats["input"])
+        if old_stats is None:
+            continue
+        print(f"{stats['input']:<24} throughput x{stats['throughput'] / old_stats['throughput']:.2f}, "
+              f"peak memory x{stats['peak_memory'] / old_stats['peak_memory']:.2f} of baseline")
+
+
+def main():
+    _, options = parse_arguments(argv[1:])
+    # Sizes of the generated texts in megabytes, such as 1,10,100,1000
+    sizes = [float(size) for size in (options.get("sizes") or "1,10,100").split(",")]
+    files = list(filter(None, (options.get("files") or "").split(",")))
+    seed = int(options.get("seed") or 0)
+    baseline_path = options.get("baseline") or "benchmark_baseline.json"
+
+    with tempfile.TemporaryDirectory() as directory:
+        inputs = []
+        for size in sizes:
+            input_path = os.path.join(directory, f"generated_{size:g}MB.txt")
+            generate_text(input_path, int(size * 1024 * 1024), seed)
+            inputs.append((f"generated {size:g} MB", input_path))
+        inputs += [(os.path.basename(path), path) for path in files]
+        results = run_benchmark(inputs)
+
+    # The first run becomes the baseline, later runs are compared with it until it is updated
+    try:
+        with open(baseline_path, "r") as baseline:
+            compare_with_baseline(results, json.load(baseline)["results"])
+        if "update-baseline" not in options:
+            return
+    except FileNotFoundError:
+        pass
+    with open(baseline_path, "w") as baseline:
+        json.dump({"time": time.time(), "seed": seed, "results": results}, baseline)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,79 @@
+import io
+import random
+
+import pytest
+
+from test_tokenizer import CORPUS, random_texts
+from text_analyzer import (
+    analyze_file_ngrams, count_ngrams, count_text, create_ngram_table, load_ngram_table, merge_ngram_tables,
+    ngram_items, prune_ngrams, save_ngram_table
+)
+
+
+TEXTS = CORPUS + [
+    "Pi is 3.14 and e.g. Mr.Smith said so.",
+    "One two three. Four five six! Seven (eight) nine... ten",
+]
+
+
+def ngram_statistics(table):
+    # N-grams with their counts, words with their counts and the total, independent of the word numbers
+    word_counts = {word: table["word_counts"][number] for number, word in enumerate(table["words"])}
+    return dict(ngram_items(table)), {word: count for word, count in word_counts.items() if count}, table["total"]
+
+
+def count_document(text, n, chunk_size=1024 * 1024):
+    return analyze_file_ngrams(io.StringIO(text), create_ngram_table(n), chunk_size)
+
+
+@pytest.mark.parametrize("text", TEXTS + list(random_texts(500)))
+def test_words_match_count_text(text):
+    table = count_document(text, 2)
+    _, word_counts, _ = ngram_statistics(table)
+    assert word_counts == dict(count_text(text)["frequencies"])
+
+
+def test_ngrams_do_not_cross_sentence_ends():
+    ngrams, _, total = ngram_statistics(count_document("Pi is 3.14 and e.g. Mr.Smith said so. Yes!", 2))
+    assert ngrams == {("pi", "is"): 1, ("is", "3.14"): 1, ("3.14", "and"): 1, ("and", "e.g"): 1,
+                      ("mr.smith", "said"): 1, ("said", "so"): 1}
+    assert total == 6
+
+
+@pytest.mark.parametrize("n", [1, 2, 3])
+@pytest.mark.parametrize("chunk_size", [1, 2, 3, 7, 64])
+def test_chunks_match_whole_text(n, chunk_size):
+    text = " ".join(TEXTS + list(random_texts(50, seed=chunk_size)))
+    assert ngram_statistics(count_document(text, n, chunk_size)) == ngram_statistics(count_document(text, n))
+
+
+def test_save_load_merge_and_prune(tmp_path):
+    generator = random.Random(0)
+    vocabulary = ["a", "b", "c", "d", "e"]
+    documents = [" ".join(generator.choice(vocabulary) + generator.choice(["", "", "."]) for _ in range(200))
+                 for _ in range(2)]
+    first_table, second_table = count_document(documents[0], 3), count_document(documents[1], 3)
+
+    path = tmp_path / "first.json"
+    save_ngram_table(first_table, path)
+    assert ngram_statistics(load_ngram_table(path)) == ngram_statistics(first_table)
+
+    # Merging the tables of two documents is the same as counting both into one table
+    both_table = count_document(documents[0], 3)
+    count_ngrams(both_table, documents[1])
+    merged_table = merge_ngram_tables(load_ngram_table(path), second_table)
+    assert ngram_statistics(merged_table) == ngram_statistics(both_table)
+
+    ngrams, word_counts, total = ngram_statistics(merged_table)
+    assert ngram_statistics(prune_ngrams(merged_table, 3)) == (
+        {ngram: count for ngram, count in ngrams.items() if count >= 3}, word_counts, total
+    )
+    # Pruned tables can still take new n-grams
+    count_ngrams(merged_table, "a b c")
+    kept_count = ngrams.get(("a", "b", "c"), 0) if ngrams.get(("a", "b", "c"), 0) >= 3 else 0
+    assert dict(ngram_items(merged_table))[("a", "b", "c")] == kept_count + 1
+
+
+def test_merge_rejects_different_lengths():
+    with pytest.raises(ValueError):
+        merge_ngram_tables(create_ngram_table(2), create_ngram_table(3))
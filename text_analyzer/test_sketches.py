@@ -0,0 +1,80 @@
+import random
+from collections import Counter
+
+import pytest
+
+from text_analyzer import (
+    add_to_sketch, create_sketch, estimate_count, estimate_distinct_words, load_sketch, merge_sketches, save_sketch
+)
+
+
+def random_frequencies(seed, words=5000, occurrences=50000):
+    # Word frequencies follow Zipf's law like in natural text
+    generator = random.Random(seed)
+    vocabulary = [f"word{seed}_{index}" for index in range(words)]
+    weights = [1 / rank for rank in range(1, words + 1)]
+    return Counter(generator.choices(vocabulary, weights, k=occurrences))
+
+
+def sketch_of(frequencies, **settings):
+    sketch = create_sketch(**settings)
+    add_to_sketch(sketch, frequencies)
+    return sketch
+
+
+def test_count_estimates_are_within_bounds():
+    frequencies = random_frequencies(0)
+    epsilon, delta = 0.001, 0.01
+    sketch = sketch_of(frequencies, epsilon=epsilon, delta=delta)
+    total = sum(frequencies.values())
+
+    errors = [estimate_count(sketch, word) - count for word, count in frequencies.items()]
+    # Estimates are never too low, and too high by more than epsilon * total only with probability delta
+    assert min(errors) >= 0
+    assert sum(error > epsilon * total for error in errors) <= 2 * delta * len(errors)
+
+
+@pytest.mark.parametrize("distinct_words", [100, 5000, 50000])
+def test_distinct_word_estimate_is_within_bounds(distinct_words):
+    precision = 12
+    sketch = sketch_of(Counter(f"word{index}" for index in range(distinct_words)), precision=precision)
+    # Standard error is about 1.04 / sqrt(2 ** precision), three of them are allowed
+    assert abs(estimate_distinct_words(sketch) - distinct_words) <= 3 * 1.04 / 2 ** (precision / 2) * distinct_words
+
+
+def test_heavy_hitters_are_the_most_frequent_words():
+    frequencies = random_frequencies(1)
+    sketch = sketch_of(frequencies, heavy_hitters=20)
+    assert {word for word, _ in frequencies.most_common(10)} <= set(sketch["candidates"])
+
+
+def test_merged_sketch_matches_sketch_of_both_texts(tmp_path):
+    first_frequencies, second_frequencies = random_frequencies(2), random_frequencies(3)
+    merged_sketch = sketch_of(first_frequencies, heavy_hitters=20)
+    path = tmp_path / "second.json"
+    save_sketch(sketch_of(second_frequencies, heavy_hitters=20), path)
+    merge_sketches(merged_sketch, load_sketch(path))
+
+    both_sketch = sketch_of(first_frequencies + second_frequencies, heavy_hitters=20)
+    assert merged_sketch["table"] == both_sketch["table"]
+    assert merged_sketch["registers"] == both_sketch["registers"]
+    assert merged_sketch["shortest_words"] == both_sketch["shortest_words"]
+    assert merged_sketch["longest_words"] == both_sketch["longest_words"]
+    both_frequencies = first_frequencies + second_frequencies
+    assert {word for word, _ in both_frequencies.most_common(10)} <= set(merged_sketch["candidates"])
+    for word, estimate in merged_sketch["candidates"].items():
+        assert estimate == estimate_count(both_sketch, word) >= both_frequencies[word]
+
+
+def test_sketches_with_different_settings_are_not_merged():
+    with pytest.raises(ValueError):
+        merge_sketches(create_sketch(epsilon=0.01), create_sketch(epsilon=0.001))
+
+
+@pytest.mark.parametrize("settings", [
+    {"epsilon": 0}, {"epsilon": -0.1}, {"delta": 0}, {"delta": 1}, {"delta": 1.5},
+    {"heavy_hitters": 0}, {"precision": 0}, {"precision": 3}, {"precision": 19}, {"precision": 65},
+])
+def test_invalid_settings_are_rejected(settings):
+    with pytest.raises(ValueError):
+        create_sketch(**settings)
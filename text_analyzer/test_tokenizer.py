@@ -0,0 +1,105 @@
+import random
+import re
+from collections import Counter
+
+import pytest
+
+from text_analyzer import (
+    count_bytes, count_text, empty_counts, merge_counts, number_of_sentences, number_of_words,
+    read_byte_chunks, words_frequency
+)
+
+
+# Patterns of the original tokenizer, the compiled and the bytes patterns must give the same results
+WORD_PUNCTUATION = r"(?<!\w)[^\w\s'-]+|[^\w\s'-]+(?!\w)|(?<=\w)'(?!\w)"
+SENTENCE_END = r"(?<=\w|\))(?:\.\.\.|\?|!|\.)|(?<=\w|\))(?:\.\.\.|\?|!|\.)$"
+
+CORPUS = [
+    "",
+    " ",
+    "Hello world. Bye!",
+    "Is it? Yes... It is!",
+    "well-known words aren't split, but 'quoted' ones are.",
+    "Tim's book. The students' books.",
+    "a.b a.,b ,a b, -a- --- ''' (a) (b). [c]!",
+    "Numbers 1.5 and 2,000 or 3rd_place.",
+    "End with ellipsis...",
+    "(parenthesis).",
+    "...",
+    "Tabs\tand\vvertical\ftabs. Next\nline",
+    "Windows\r\nline endings.\r\nAnd\rold Mac ones.\r\n",
+    "Ends with carriage return.\r",
+    "File\x1cgroup\x1drecord\x1eunit\x1fseparators.",
+    "Non ASCII: İstanbul café σοφός. ΣΟΦΟΣ!",
+    "Mixed\r\nİ\x1cé.",
+    "Un\x00usual\x7fcontrol characters.",
+]
+
+
+def random_texts(count, seed=0):
+    # Random strings from the characters that the patterns treat differently
+    generator = random.Random(seed)
+    alphabet = "aZ9_ .!?...'-,()\t\n\r\x0b\x0c\x1c\x1fİé"
+    for _ in range(count):
+        yield "".join(generator.choice(alphabet) for _ in range(generator.randint(0, 40)))
+
+
+def read_as_text(text):
+    # Line endings as they are read in text mode
+    return text.replace("\r\n", "\n").replace("\r", "\n")
+
+
+def reference_counts(text):
+    words = re.sub(WORD_PUNCTUATION, "", text).split()
+    lowercase_words = re.sub(WORD_PUNCTUATION, "", text.lower()).split()
+    sentences = [sentence for sentence in re.split(SENTENCE_END, text) if sentence.strip()]
+
+    return {
+        "words": len(words),
+        "characters": len(text),
+        "word_characters": sum(map(len, words)),
+        "frequencies": Counter(lowercase_words),
+        "sentences": len(sentences),
+    }
+
+
+TEXTS = CORPUS + list(random_texts(2000))
+
+
+@pytest.mark.parametrize("text", TEXTS)
+def test_count_text_matches_original_patterns(text):
+    counts = count_text(text)
+    expected = reference_counts(text)
+    assert {name: counts[name] for name in expected} == expected
+
+
+@pytest.mark.parametrize("text", TEXTS)
+def test_functions_match_original_patterns(text):
+    expected = reference_counts(text)
+    lowercase_words = sum(expected["frequencies"].values())
+    assert len(number_of_words(text)) == expected["words"]
+    assert number_of_sentences(text) == expected["sentences"]
+    assert words_frequency(text) == {word: count / lowercase_words for word, count in expected["frequencies"].items()}
+
+
+@pytest.mark.parametrize("text", TEXTS)
+def test_count_bytes_matches_count_text(text):
+    data = text.encode()
+    if data.endswith(b"\r"):
+        # Bytes must not end with the first half of "\r\n", so a last "\r" is counted as a new line
+        data = data[:-1] + b"\n"
+    assert count_bytes(data) == count_text(read_as_text(data.decode()))
+    assert count_bytes(memoryview(data)) == count_text(read_as_text(data.decode()))
+
+
+@pytest.mark.parametrize("chunk_size", [1, 2, 3, 7, 64])
+def test_byte_chunks_match_whole_text(chunk_size, tmp_path):
+    text = "".join(CORPUS + list(random_texts(50, seed=chunk_size)))
+    path = tmp_path / "input.txt"
+    path.write_bytes(text.encode())
+
+    counts = empty_counts()
+    with open(path, "rb") as binary_file:
+        for chunk in read_byte_chunks(binary_file, 0, path.stat().st_size, chunk_size):
+            merge_counts(counts, count_bytes(chunk))
+    assert counts == count_text(read_as_text(text))
@@ -1,10 +1,43 @@
-from sys import argv
-from collections import Counter
+from sys import argv, maxsize
+from collections import Counter, deque
+import array
+import base64
+import bisect
+import codecs
+import csv
+import glob
+import hashlib
+import heapq
+import io
+import json
 import locale
+import math
+import mmap
+import multiprocessing
+import os
 import re
+import stat
+import time
+import tracemalloc
 
 
-locale.setlocale(locale.LC_ALL, "en_US")
+# Patterns are compiled once. Standalone punctuations and those at the end of words,
+# except ' and - between words
+WORD_PUNCTUATION = re.compile(r"(?<!\w)[^\w\s'-]+|[^\w\s'-]+(?!\w)|(?<=\w)'(?!\w)")
+SENTENCE_END = re.compile(r"(?<=\w|\))(?:\.\.\.|\?|!|\.)|(?<=\w|\))(?:\.\.\.|\?|!|\.)$")
+# Same patterns for ASCII bytes, where \w and \s match the same characters as in ASCII text
+BYTE_WORD_PUNCTUATION = re.compile(WORD_PUNCTUATION.pattern.encode())
+BYTE_SENTENCE_END = re.compile(SENTENCE_END.pattern.encode())
+# Control characters that are white-spaces in text but not in bytes
+BYTE_TEXT_ONLY_SPACES = re.compile(b"[\x1c-\x1f]")
+# White-spaces that a part of bytes can be cut after, carriage return is not one of them
+# because it can be the first half of a line ending
+BYTE_CUT_SPACES = (b" ", b"\t", b"\n", b"\x0b", b"\x0c")
+# Words of the text without punctuations, the same ones as str.split() gives
+NON_SPACES = re.compile(r"\S+")
+
+# Number of n-grams added to an n-gram table at once while merging tables
+NGRAM_BATCH_SIZE = 65536
 
 
 def number_of_words(text):
@@ -18,7 +51,7 @@ def number_of_words(text):
         list: Words in given text.
     """
     # Remove standalone punctuations and those at the end, preserve ' and - between words
-    tokenized_text = re.sub(r"(?<!\w)[^\w\s'-]+|[^\w\s'-]+(?!\w)|(?<=\w)'(?!\w)", "", text)
+    tokenized_text = WORD_PUNCTUATION.sub("", text)
     words = tokenized_text.split()
 
     return words
@@ -35,7 +68,7 @@ def number_of_sentences(text):
     """
     tokenized_text = []
     # Split text into a list of sentences based on punctuation
-    for sentence in re.split(r"(?<=\w|\))(?:\.\.\.|\?|!|\.)|(?<=\w|\))(?:\.\.\.|\?|!|\.)$", text):
+    for sentence in SENTENCE_END.split(text):
         if sentence.strip():
            tokenized_text.append(sentence.strip())
 
@@ -173,56 +206,1614 @@ def longest_word(text):
     return sorted(list_of_longest_words, key=lambda x: (-x[1], x[0]))
 
 
+def sentence_counts(text):
+    """Calculate number of sentences in given text together with what is needed to join it with
+       the sentences of the text before or after it (see number_of_sentences).
+
+    Args:
+        text (str): Input text to be analyzed.
+
+    Returns:
+        tuple: Number of sentences, if the first and the last part of the text (before the first and
+               after the last end of sentence) are not empty, and if there is any end of sentence.
+    """
+    parts = SENTENCE_END.split(text)
+    sentences = sum(1 for part in parts if part.strip())
+
+    return sentences, bool(parts[0].strip()), bool(parts[-1].strip()), len(parts) > 1
+
+
+def count_text(text, profile=None):
+    """Count words, sentences and characters of given text. Counts of consecutive parts of a text can be
+       joined with merge_counts, so a text can be counted part by part if it is cut at white-spaces.
+
+    Args:
+        text (str): Input text to be analyzed.
+        profile (dict): Times and memory of the stages (see record_stage), not recorded if it is None.
+
+    Returns:
+        dict: Counts of given text.
+    """
+    stage_start = time.perf_counter()
+    # Lowercasing ASCII text does not change its words or their lengths, so the lowercase text
+    # is tokenized only once. Other characters (such as "İ" that becomes two characters)
+    # may change the words, so the original text is tokenized too
+    lowercase_words = number_of_words(text.lower())
+    words = lowercase_words if text.isascii() else number_of_words(text)
+    stage_start = record_stage(profile, "tokenize", stage_start)
+    sentences, starts_in_sentence, ends_in_sentence, has_sentence_end = sentence_counts(text)
+    stage_start = record_stage(profile, "sentences", stage_start)
+    frequencies = Counter(lowercase_words)
+    record_stage(profile, "frequencies", stage_start)
+
+    return {
+        "words": len(words),
+        "characters": len(text),
+        "word_characters": sum(map(len, words)),
+        "frequencies": frequencies,
+        "sentences": sentences,
+        "starts_in_sentence": starts_in_sentence,
+        "ends_in_sentence": ends_in_sentence,
+        "has_sentence_end": has_sentence_end,
+    }
+
+
+def count_bytes(data, encoding="utf-8", profile=None):
+    """Count words, sentences and characters of given bytes of a file (see count_text) without decoding
+       them when they are ASCII. Line endings are counted as they are read in text mode ("\\r\\n" is one character).
+
+    Args:
+        data (bytes): Input bytes to be analyzed, they must not end with the first half of "\\r\\n".
+                      Other bytes-like objects (such as memoryview) are copied into bytes first.
+        encoding (str): Encoding of the bytes, it must be compatible with ASCII.
+        profile (dict): Times and memory of the stages (see record_stage), not recorded if it is None.
+
+    Returns:
+        dict: Counts of given bytes.
+    """
+    data = bytes(data)
+    if not data.isascii() or BYTE_TEXT_ONLY_SPACES.search(data):
+        text = data.decode(encoding).replace("\r\n", "\n").replace("\r", "\n")
+        return count_text(text, profile)
+
+    # Lowercasing, removing the punctuations and splitting are done on the bytes (three passes
+    # in C, no decoding), only distinct words are decoded
+    stage_start = time.perf_counter()
+    lowercase_words = BYTE_WORD_PUNCTUATION.sub(b"", data.lower()).split()
+    stage_start = record_stage(profile, "tokenize", stage_start)
+    parts = BYTE_SENTENCE_END.split(data)
+    sentences = sum(1 for part in parts if part.strip())
+    stage_start = record_stage(profile, "sentences", stage_start)
+    frequencies = Counter({word.decode(): count for word, count in Counter(lowercase_words).items()})
+    record_stage(profile, "frequencies", stage_start)
+
+    return {
+        "words": len(lowercase_words),
+        "characters": len(data) - data.count(b"\r\n"),
+        "word_characters": sum(map(len, lowercase_words)),
+        "frequencies": frequencies,
+        "sentences": sentences,
+        "starts_in_sentence": bool(parts[0].strip()),
+        "ends_in_sentence": bool(parts[-1].strip()),
+        "has_sentence_end": len(parts) > 1,
+    }
+
+
+def empty_counts():
+    """Create counts of an empty text, merging them with any counts gives the same counts.
+
+    Returns:
+        dict: Counts of an empty text.
+    """
+    return {
+        "words": 0,
+        "characters": 0,
+        "word_characters": 0,
+        "frequencies": Counter(),
+        "sentences": 0,
+        "starts_in_sentence": False,
+        "ends_in_sentence": False,
+        "has_sentence_end": False,
+    }
+
+
+def merge_counts(counts, next_counts, join_sentences=True):
+    """Add counts of a text to the counts of the text just before it. Sentence that is cut between
+       the two texts is counted only once.
+
+    Args:
+        counts (dict): Counts of the first text, they are updated.
+        next_counts (dict): Counts of the text that follows the first text.
+        join_sentences (bool): False if the texts are separate documents, so no sentence is cut between them.
+
+    Returns:
+        dict: Counts of both texts.
+    """
+    if join_sentences and counts["ends_in_sentence"] and next_counts["starts_in_sentence"]:
+        counts["sentences"] -= 1
+    counts["sentences"] += next_counts["sentences"]
+
+    # Without an end of sentence the whole text is the first (and the last) part of the sentence
+    if not counts["has_sentence_end"]:
+        counts["starts_in_sentence"] = counts["starts_in_sentence"] or next_counts["starts_in_sentence"]
+    if next_counts["has_sentence_end"]:
+        counts["ends_in_sentence"] = next_counts["ends_in_sentence"]
+    else:
+        counts["ends_in_sentence"] = counts["ends_in_sentence"] or next_counts["ends_in_sentence"]
+    counts["has_sentence_end"] = counts["has_sentence_end"] or next_counts["has_sentence_end"]
+
+    for key in ("words", "characters", "word_characters"):
+        counts[key] += next_counts[key]
+    counts["frequencies"].update(next_counts["frequencies"])
+
+    return counts
+
+
+def build_vocabulary(dictionary_of_frequencies):
+    """Group the words by their lengths, so words of a length are found without checking all words.
+
+    Args:
+        dictionary_of_frequencies (dict): Frequencies of words.
+
+    Returns:
+        dict: Lists of (word, frequency) pairs by the length of the words.
+    """
+    vocabulary = {}
+    for word, frequency in dictionary_of_frequencies.items():
+        vocabulary.setdefault(len(word), []).append((word, frequency))
+
+    return vocabulary
+
+
+def words_of_length(vocabulary, length):
+    """Get the words of given length from the vocabulary in frequency order.
+
+    Args:
+        vocabulary (dict): Words grouped by length (see build_vocabulary).
+        length (int): Length of the words.
+
+    Returns:
+        list: (word, frequency) pairs of the words with given length.
+    """
+    # Sort according to frequency in descending order,
+    # if frequency is the same sort it according to the increasing alphabetical order.
+    # Group is kept sorted, so it is sorted only once
+    words = vocabulary.get(length, [])
+    words.sort(key=lambda x: (-x[1], x[0]))
+
+    return words
+
+
+def most_frequent_words(dictionary_of_frequencies, top=None):
+    """Get the most frequent words in frequency order. A heap is used to find them, so the
+       whole vocabulary is not sorted when only a few words are needed.
+
+    Args:
+        dictionary_of_frequencies (dict): Frequencies of words.
+        top (int): Number of words to get, all words if it is None.
+
+    Returns:
+        list: (word, frequency) pairs of the most frequent words.
+    """
+    # Sort according to frequency in descending order,
+    # if frequency is the same sort it according to the increasing alphabetical order
+    if top is None:
+        return sorted(dictionary_of_frequencies.items(), key=lambda x: (-x[1], x[0]))
+
+    return heapq.nsmallest(top, dictionary_of_frequencies.items(), key=lambda x: (-x[1], x[0]))
+
+
+def summarize_counts(counts):
+    """Calculate the statistics of the report from the counts of a text.
+
+    Args:
+        counts (dict): Counts of the text.
+
+    Returns:
+        dict: Number of words, sentences, characters and characters of words, frequencies and
+              numbers of occurrences of words and the shortest and longest words with their frequencies.
+    """
+    number_of_lowercase_words = sum(counts["frequencies"].values())
+
+    dictionary_of_frequencies = Counter()
+    for word, frequency in counts["frequencies"].items():
+        dictionary_of_frequencies[word] = frequency / number_of_lowercase_words
+
+    # The shortest and longest words are the first and last groups of the vocabulary
+    vocabulary = build_vocabulary(dictionary_of_frequencies)
+    list_of_shortest_words = words_of_length(vocabulary, min(vocabulary, default=0))
+    list_of_longest_words = words_of_length(vocabulary, max(vocabulary, default=0))
+
+    return {
+        "words": counts["words"],
+        "sentences": counts["sentences"],
+        "characters": counts["characters"],
+        "word_characters": counts["word_characters"],
+        "frequencies": dictionary_of_frequencies,
+        "word_counts": counts["frequencies"],
+        "shortest": list_of_shortest_words,
+        "longest": list_of_longest_words,
+    }
+
+
+def read_chunks(file_input, chunk_size):
+    """Read given file in parts of about chunk_size characters. Every part is cut right after a
+       white-space, so no word or end of sentence is split between two parts.
+
+    Args:
+        file_input (file): File to be read.
+        chunk_size (int): Number of characters to read at once.
+
+    Yields:
+        str: Next part of the file.
+    """
+    return cut_chunks(iter(lambda: file_input.read(chunk_size), ""))
+
+
+def cut_chunks(parts):
+    """Cut consecutive parts of a text right after their last white-space (see read_chunks).
+
+    Args:
+        parts (iterable): Consecutive parts of a text.
+
+    Yields:
+        str: Next part of the text.
+    """
+    rest = ""
+    for chunk in parts:
+        if not chunk:
+            continue
+        chunk = rest + chunk
+
+        # Find the last white-space, the text after it is carried to the next part
+        cut = len(chunk)
+        while cut > 0 and not chunk[cut - 1].isspace():
+            cut -= 1
+        if cut == 0:
+            rest = chunk
+            continue
+
+        yield chunk[:cut]
+        rest = chunk[cut:]
+
+    if rest:
+        yield rest
+
+
+def report_lines(input_name, analysis, top=None):
+    """Create the lines of the report in the text format.
+
+    Args:
+        input_name (str): Name of the analyzed file.
+        analysis (dict): Statistics returned by summarize_counts.
+        top (int): Number of the most frequent words to write, all words if it is None.
+
+    Yields:
+        str: Next part of the report.
+    """
+    yield 'Statistics about {:<7}:\n'.format(input_name)
+    yield f'{"#Words":<24}: {analysis["words"]}\n'
+    yield f'{"#Sentences":<24}: {analysis["sentences"]}\n'
+    yield f'{"#Words/#Sentences":<24}: {analysis["words"] / analysis["sentences"]:.2f}\n'
+    yield f'{"#Characters":<24}: {analysis["characters"]}\n'
+    yield f'{"#Characters (Just Words)":<24}: {analysis["word_characters"]}\n'
+
+    # Check if there is more than one shortest word and format output according to it
+    if len(analysis["shortest"]) > 1:
+        yield f'{"The Shortest Words":<24}:\n'
+    else:
+        yield f'{"The Shortest Word":<24}: '
+    for word, frequency in analysis["shortest"]:
+        yield '{:<24} ({:.4f})\n'.format(word, frequency)
+
+    # Check if there is more than one longest word and format output according to it
+    if len(analysis["longest"]) > 1:
+        yield f'{"The Longest Words":<24}:\n'
+    else:
+        yield f'{"The Longest Word":<24}: '
+    for word, frequency in analysis["longest"]:
+        yield '{:<24} ({:.4f})\n'.format(word, frequency)
+
+    yield f'{"Words and Frequencies":<24}:'
+    for word, frequency in most_frequent_words(analysis["frequencies"], top):
+        yield f'\n{word:<24}: {frequency:.4f}'
+
+
+def json_report_lines(input_name, analysis, top=None):
+    """Create the lines of the report in the JSON lines format. First line has the statistics,
+       every other line has one word with its number of occurrences and frequency.
+
+    Args:
+        input_name (str): Name of the analyzed file.
+        analysis (dict): Statistics returned by summarize_counts.
+        top (int): Number of the most frequent words to write, all words if it is None.
+
+    Yields:
+        str: Next line of the report.
+    """
+    yield json.dumps({
+        "type": "summary",
+        "file": input_name,
+        "words": analysis["words"],
+        "sentences": analysis["sentences"],
+        "words_per_sentence": analysis["words"] / analysis["sentences"],
+        "characters": analysis["characters"],
+        "word_characters": analysis["word_characters"],
+        "shortest": analysis["shortest"],
+        "longest": analysis["longest"],
+    }) + "\n"
+    word_counts = analysis["word_counts"]
+    for word, frequency in most_frequent_words(analysis["frequencies"], top):
+        yield json.dumps({"type": "word", "word": word, "count": word_counts[word], "frequency": frequency}) + "\n"
+
+
+def csv_report_lines(input_name, analysis, top=None):
+    """Create the lines of the report in the CSV format, one word with its number of occurrences
+       and frequency in every line.
+
+    Args:
+        input_name (str): Name of the analyzed file.
+        analysis (dict): Statistics returned by summarize_counts.
+        top (int): Number of the most frequent words to write, all words if it is None.
+
+    Yields:
+        str: Next line of the report.
+    """
+    # Rows are quoted by csv.writer into a string, so they can be written in blocks (see write_buffered)
+    line = io.StringIO()
+    writer = csv.writer(line, lineterminator="\n")
+    writer.writerow(["word", "count", "frequency"])
+    word_counts = analysis["word_counts"]
+    for word, frequency in most_frequent_words(analysis["frequencies"], top):
+        yield line.getvalue()
+        line.seek(0)
+        line.truncate()
+        writer.writerow([word, word_counts[word], frequency])
+    yield line.getvalue()
+
+
+def write_buffered(file_output, lines, buffer_size=65536):
+    """Write the lines in large blocks instead of one write for every line.
+
+    Args:
+        file_output (file): File to write the lines to.
+        lines (iterable): Lines to be written.
+        buffer_size (int): Number of lines in one block.
+    """
+    buffer = []
+    for line in lines:
+        buffer.append(line)
+        if len(buffer) >= buffer_size:
+            file_output.write("".join(buffer))
+            buffer.clear()
+    file_output.write("".join(buffer))
+
+
+def write_report(file_output, input_name, analysis, top=None, report_format="text"):
+    """Write the statistics of the analyzed text. Text format is the fixed width report, JSON lines and
+       CSV formats are for other programs (CSV has only the words with their numbers of occurrences
+       and frequencies).
+
+    Args:
+        file_output (file): File to write the report to.
+        input_name (str): Name of the analyzed file.
+        analysis (dict): Statistics returned by summarize_counts.
+        top (int): Number of the most frequent words to write, all words if it is None.
+        report_format (str): "text", "jsonl" or "csv".
+    """
+    if report_format == "text":
+        write_buffered(file_output, report_lines(input_name, analysis, top))
+    elif report_format == "jsonl":
+        write_buffered(file_output, json_report_lines(input_name, analysis, top))
+    elif report_format == "csv":
+        write_buffered(file_output, csv_report_lines(input_name, analysis, top))
+    else:
+        raise ValueError(f"Unknown report format: {report_format}")
+
+
+def analyze_file_parallel(file_input, chunk_size=1024 * 1024, workers=None):
+    """Calculate all statistics of given file by counting its parts on a pool of worker processes and
+       merging their counts in the order of the parts. Statistics are the same as the ones of count_file.
+
+    Args:
+        file_input (file): File to be analyzed.
+        chunk_size (int): Number of characters in every part.
+        workers (int): Number of worker processes, number of CPUs if it is None.
+
+    Returns:
+        dict: Statistics of given file (see summarize_counts).
+    """
+    workers = workers or os.cpu_count() or 1
+    counts = empty_counts()
+    pending = deque()
+
+    with multiprocessing.Pool(workers) as pool:
+        # Only a few parts per worker are read ahead, so memory stays bounded for large files
+        for chunk in read_chunks(file_input, chunk_size):
+            pending.append(pool.apply_async(count_text, (chunk,)))
+            if len(pending) >= workers * 2:
+                merge_counts(counts, pending.popleft().get())
+        while pending:
+            merge_counts(counts, pending.popleft().get())
+
+    return summarize_counts(counts)
+
+
+def read_text_range(binary_file, start, end, chunk_size):
+    """Read and decode given range of bytes of a file in parts, translating the line endings the same
+       way as opening the file in text mode. Range must start right after a new line.
+
+    Args:
+        binary_file (file): File opened in binary mode.
+        start (int): First byte of the range, the range starts at the current position if it is None.
+        end (int): Byte after the last byte of the range.
+        chunk_size (int): Number of bytes to read at once.
+
+    Yields:
+        str: Next decoded part of the range.
+    """
+    decoder = io.IncrementalNewlineDecoder(
+        codecs.getincrementaldecoder(locale.getpreferredencoding(False))(), translate=True
+    )
+    # Pipes can not seek, they are read from where they are
+    if start is not None:
+        binary_file.seek(start)
+    remaining = end - (start or 0)
+    while remaining > 0:
+        data = binary_file.read(min(chunk_size, remaining))
+        if not data:
+            # File ended before the range (size of the file was not known), the decoder is flushed
+            yield decoder.decode(b"", final=True)
+            break
+        remaining -= len(data)
+        yield decoder.decode(data, final=remaining == 0)
+
+
+def read_byte_chunks(binary_file, start, end, chunk_size):
+    """Read given range of bytes of a file in parts of about chunk_size bytes. Every part is cut right
+       after a white-space (see read_chunks), which is never inside a character in UTF-8.
+
+    Args:
+        binary_file (file): File opened in binary mode.
+        start (int): First byte of the range, the range starts at the current position if it is None.
+        end (int): Byte after the last byte of the range.
+        chunk_size (int): Number of bytes to read at once.
+
+    Yields:
+        bytes: Next part of the range.
+    """
+    # Pipes can not seek, they are read from where they are
+    if start is not None:
+        binary_file.seek(start)
+    remaining = end - (start or 0)
+    rest = b""
+    while remaining > 0:
+        chunk = binary_file.read(min(chunk_size, remaining))
+        if not chunk:
+            break
+        remaining -= len(chunk)
+        chunk = rest + chunk
+
+        cut = max(chunk.rfind(space) for space in BYTE_CUT_SPACES) + 1
+        if cut == 0:
+            rest = chunk
+            continue
+
+        yield chunk[:cut]
+        rest = chunk[cut:]
+
+    if rest:
+        yield rest
+
+
+def count_range(binary_file, start, end, chunk_size, profile=None):
+    """Count given range of bytes of a file part by part. UTF-8 and ASCII files are counted on their
+       bytes, other encodings are decoded first.
+
+    Args:
+        binary_file (file): File opened in binary mode.
+        start (int): First byte of the range, right after a new line (None for the current position).
+        end (int): Byte after the last byte of the range.
+        chunk_size (int): Number of bytes to read at once.
+        profile (dict): Times and memory of the stages (see record_stage), not recorded if it is None.
+
+    Returns:
+        dict: Counts of the range (see count_text).
+    """
+    counts = empty_counts()
+    encoding = codecs.lookup(locale.getpreferredencoding(False)).name
+    if encoding in ("utf-8", "ascii"):
+        chunks = read_byte_chunks(binary_file, start, end, chunk_size)
+        count_chunk = lambda chunk: count_bytes(chunk, encoding, profile)
+    else:
+        chunks = cut_chunks(read_text_range(binary_file, start, end, chunk_size))
+        count_chunk = lambda chunk: count_text(chunk, profile)
+
+    stage_start = time.perf_counter()
+    for chunk in chunks:
+        stage_start = record_stage(profile, "read", stage_start)
+        chunk_counts = count_chunk(chunk)
+        stage_start = time.perf_counter()
+        merge_counts(counts, chunk_counts)
+        stage_start = record_stage(profile, "merge", stage_start)
+
+    return counts
+
+
+def count_file(input_path, chunk_size=1024 * 1024, profile=None):
+    """Count given file part by part (see count_range). Regular files are memory-mapped, so the OS reads
+       their pages only when they are counted and the file is never copied into one string.
+
+    Args:
+        input_path (str): Path of the file.
+        chunk_size (int): Number of bytes to read at once.
+        profile (dict): Times and memory of the stages (see record_stage), not recorded if it is None.
+
+    Returns:
+        dict: Counts of the file (see count_text).
+    """
+    with open(input_path, "rb") as binary_file:
+        file_stat = os.fstat(binary_file.fileno())
+        # Only regular files with a known size can be memory-mapped, empty files, pipes and
+        # files like the ones in /proc (which have zero size) are read until their end
+        if not stat.S_ISREG(file_stat.st_mode) or file_stat.st_size == 0:
+            return count_range(binary_file, None, maxsize, chunk_size, profile)
+        with mmap.mmap(binary_file.fileno(), 0, access=mmap.ACCESS_READ) as mapped_file:
+            return count_range(mapped_file, 0, file_stat.st_size, chunk_size, profile)
+
+
+def count_file_cached(input_path, cache_directory, chunk_size=1024 * 1024, profile=None):
+    """Count given file, reusing the counts of its previous analysis from the cache. Unchanged files
+       (same size, modification time and encoding) are not read again. If the file only grew, the counts are
+       kept until its last new line before the change and only the rest of the file is counted again.
+
+    Args:
+        input_path (str): Path of the file.
+        cache_directory (str): Directory of the cached counts.
+        chunk_size (int): Number of bytes to read at once.
+        profile (dict): Times and memory of the stages (see record_stage), not recorded if it is None.
+
+    Returns:
+        dict: Counts of the file (see count_text).
+    """
+    stage_start = time.perf_counter()
+    file_stat = os.stat(input_path)
+    cache_path = os.path.join(
+        cache_directory, hashlib.sha256(os.path.abspath(input_path).encode()).hexdigest() + ".json"
+    )
+    try:
+        with open(cache_path, "r") as cache_file:
+            entry = json.load(cache_file)
+    except (FileNotFoundError, ValueError):
+        entry = None
+    # Counts depend on how the file is decoded, so counts of another encoding are not reused
+    encoding = codecs.lookup(locale.getpreferredencoding(False)).name
+    if entry is not None and entry.get("encoding") != encoding:
+        entry = None
+    stage_start = record_stage(profile, "cache", stage_start)
+
+    if entry is None or entry["size"] != file_stat.st_size or entry["modified"] != file_stat.st_mtime_ns:
+        with open(input_path, "rb") as binary_file:
+            # Old part of the file must be the same, otherwise the whole file is counted again
+            content_hash = hashlib.sha256()
+            same_start = False
+            if entry is not None and entry["size"] <= file_stat.st_size:
+                for data in iter(lambda: binary_file.read(min(chunk_size, entry["size"] - binary_file.tell())), b""):
+                    content_hash.update(data)
+                same_start = content_hash.hexdigest() == entry["hash"]
+            if not same_start:
+                content_hash = hashlib.sha256()
+                binary_file.seek(0)
+                entry = {"committed": 0, "committed_counts": empty_counts()}
+
+            # Find the last new line, counts until it can not change when more lines are appended
+            committed = entry["committed"]
+            binary_file.seek(entry["size"] if same_start else 0)
+            position = binary_file.tell()
+            for data in iter(lambda: binary_file.read(chunk_size), b""):
+                content_hash.update(data)
+                if b"\n" in data:
+                    committed = position + data.rindex(b"\n") + 1
+                position += len(data)
+
+            # Hashing and finding the new lines is counted as reading
+            record_stage(profile, "read", stage_start)
+            committed_counts = entry["committed_counts"]
+            committed_counts["frequencies"] = Counter(committed_counts["frequencies"])
+            merge_counts(committed_counts, count_range(binary_file, entry["committed"], committed, chunk_size, profile))
+            rest_counts = count_range(binary_file, committed, position, chunk_size, profile)
+
+        entry = {
+            "encoding": encoding,
+            "size": position,
+            "modified": file_stat.st_mtime_ns,
+            "hash": content_hash.hexdigest(),
+            "committed": committed,
+            "committed_counts": committed_counts,
+            "rest_counts": rest_counts,
+        }
+        stage_start = time.perf_counter()
+        os.makedirs(cache_directory, exist_ok=True)
+        # Write to a temporary file first, so other processes never read a half written entry
+        temporary_path = f"{cache_path}.{os.getpid()}.tmp"
+        with open(temporary_path, "w") as cache_file:
+            json.dump(entry, cache_file)
+        os.replace(temporary_path, cache_path)
+        record_stage(profile, "cache", stage_start)
+
+    counts = entry["committed_counts"]
+    counts["frequencies"] = Counter(counts["frequencies"])
+    rest_counts = entry["rest_counts"]
+    rest_counts["frequencies"] = Counter(rest_counts["frequencies"])
+
+    return merge_counts(counts, rest_counts)
+
+
+def find_corpus_files(source, excluded_directories=()):
+    """Find the files of a corpus given as a directory or a glob pattern.
+
+    Args:
+        source (str): Directory (all files in it and its subdirectories) or glob pattern.
+        excluded_directories (iterable): Directories whose files are not in the corpus (such as
+                                         the directory of the reports when it is inside the corpus).
+
+    Returns:
+        tuple: Sorted list of file paths and the directory their report paths are relative to.
+    """
+    if os.path.isdir(source):
+        paths = [os.path.join(directory, name) for directory, _, names in os.walk(source) for name in names]
+        root = source
+    else:
+        paths = [path for path in glob.glob(source, recursive=True) if os.path.isfile(path)]
+        root = os.path.commonpath([os.path.dirname(os.path.abspath(path)) for path in paths]) if paths else ""
+
+    excluded_directories = [os.path.abspath(directory) for directory in excluded_directories]
+    paths = [path for path in paths if not any(
+        os.path.commonpath([os.path.abspath(path), directory]) == directory for directory in excluded_directories
+    )]
+
+    return sorted(paths), root
+
+
+def analyze_corpus_file(item):
+    """Analyze one file of a corpus and write its report. Runs in a worker process of analyze_corpus.
+
+    Args:
+        item (tuple): Input file path, report file path, number of characters to read at once,
+                      number of the most frequent words to write (None for all), directory of
+                      the cached counts (None for no cache) and format of the report.
+
+    Returns:
+        tuple: Input file path, counts of the file (None if it failed) and error message.
+    """
+    input_path, output_path, chunk_size, top, cache_directory, report_format = item
+    try:
+        if cache_directory:
+            counts = count_file_cached(input_path, cache_directory, chunk_size)
+        else:
+            counts = count_file(input_path, chunk_size)
+        if counts["characters"] == 0:
+            return input_path, None, "Input text is empty."
+
+        os.makedirs(os.path.dirname(output_path) or ".", exist_ok=True)
+        with open(output_path, "w") as file_output:
+            write_report(file_output, input_path, summarize_counts(counts), top, report_format)
+    except (OSError, UnicodeDecodeError, ZeroDivisionError) as e:
+        return input_path, None, f"{type(e).__name__}: {e}"
+
+    return input_path, counts, None
+
+
+def analyze_corpus(source, output_directory, workers=None, chunk_size=1024 * 1024, top=None,
+                   cache_directory=None, report_format="text"):
+    """Analyze every file of a corpus on a pool of worker processes. Workers read and count the files
+       and write their reports, while their counts are merged into the counts of the whole corpus
+       as soon as they are ready. Report of the whole corpus is written to corpus_report with the extension
+       of the report format (corpus_report.txt for text), with "_" in front of it if a corpus file has that name.
+
+    Args:
+        source (str): Directory or glob pattern of the corpus files.
+        output_directory (str): Directory of the reports.
+        workers (int): Number of worker processes, number of CPUs if it is None.
+        chunk_size (int): Number of characters to read at once.
+        top (int): Number of the most frequent words to write in the reports, all words if it is None.
+        cache_directory (str): Directory of the cached counts, files are always counted if it is None.
+        report_format (str): Format of the reports (see write_report).
+
+    Returns:
+        dict: Counts of the whole corpus.
+    """
+    # Reports (and cached counts) of earlier runs are not part of the corpus
+    paths, root = find_corpus_files(source, filter(None, (output_directory, cache_directory)))
+    items = [(path, os.path.join(output_directory, os.path.relpath(path, root)), chunk_size, top, cache_directory,
+              report_format) for path in paths]
+    report_name = "corpus_report." + {"text": "txt", "jsonl": "jsonl", "csv": "csv"}[report_format]
+    report_paths = {os.path.normpath(item[1]) for item in items}
+    while os.path.normpath(os.path.join(output_directory, report_name)) in report_paths:
+        report_name = "_" + report_name
+    # Output directory is created first, so a directory that can not be created fails only once
+    os.makedirs(output_directory, exist_ok=True)
+    workers = workers or os.cpu_count() or 1
+    corpus_counts = empty_counts()
+    analyzed_files = 0
+
+    with multiprocessing.Pool(workers) as pool:
+        for input_path, counts, error in pool.imap_unordered(analyze_corpus_file, items,
+                                                             max(1, len(items) // (workers * 16))):
+            if error:
+                print(f"{input_path}: {error}")
+                continue
+            # Files are separate documents, so no sentence continues from one file to another
+            merge_counts(corpus_counts, counts, join_sentences=False)
+            analyzed_files += 1
+
+    print(f"Analyzed {analyzed_files} of {len(items)} files.")
+    if analyzed_files:
+        with open(os.path.join(output_directory, report_name), "w") as file_output:
+            write_report(file_output, source, summarize_counts(corpus_counts), top, report_format)
+
+    return corpus_counts
+
+
+def word_hash(word):
+    """Calculate a 64-bit hash of given word. Unlike hash(), it is the same in every run,
+       so sketches of separate runs can be merged.
+
+    Args:
+        word (str): Word to be hashed.
+
+    Returns:
+        int: Hash of the word.
+    """
+    return int.from_bytes(hashlib.blake2b(word.encode(), digest_size=8).digest(), "big")
+
+
+def create_sketch(epsilon=0.001, delta=0.01, heavy_hitters=100, precision=14):
+    """Create an empty sketch for approximate counting. Count-Min sketch estimates the number of
+       occurrences of a word at most epsilon * (number of words) too high with probability 1 - delta,
+       HyperLogLog estimates the number of distinct words with about 1.04 / sqrt(2 ** precision) error.
+       Memory of the sketch does not grow with the number of distinct words.
+
+    Args:
+        epsilon (float): Error bound of the word counts relative to the number of words, more than 0.
+        delta (float): Probability of a word count being over the error bound, between 0 and 1.
+        heavy_hitters (int): Number of the most frequent words to keep, at least 1.
+        precision (int): Number of bits of the HyperLogLog register index, from 4 to 18.
+
+    Returns:
+        dict: Empty sketch.
+    """
+    if not epsilon > 0:
+        raise ValueError("Epsilon must be more than 0.")
+    if not 0 < delta < 1:
+        raise ValueError("Delta must be between 0 and 1.")
+    if heavy_hitters < 1:
+        raise ValueError("Number of heavy hitters must be at least 1.")
+    # Registers are indexed by the first bits of a 64-bit hash and count the leading zeros of the others
+    if not 4 <= precision <= 18:
+        raise ValueError("Precision must be between 4 and 18.")
+    width = math.ceil(math.e / epsilon)
+    depth = math.ceil(math.log(1 / delta))
+
+    return {
+        "width": width,
+        "depth": depth,
+        "table": [array.array("Q", bytes(8 * width)) for row in range(depth)],
+        "precision": precision,
+        "registers": bytearray(2 ** precision),
+        "heavy_hitters": heavy_hitters,
+        "candidates": {},
+        "threshold": 0,
+        # Counts that do not grow with the vocabulary are still exact
+        "counts": empty_counts(),
+        # Words of the shortest and longest length are kept exactly, only their frequencies are estimated
+        "shortest_words": set(),
+        "longest_words": set(),
+    }
+
+
+def estimate_count(sketch, word, hashed_word=None):
+    """Estimate the number of occurrences of a word, it is never less than the real number.
+
+    Args:
+        sketch (dict): Sketch of the text.
+        word (str): Word to be estimated.
+        hashed_word (int): Hash of the word if it is already calculated.
+
+    Returns:
+        int: Estimated number of occurrences.
+    """
+    if hashed_word is None:
+        hashed_word = word_hash(word)
+    first_hash, second_hash = hashed_word & 0xFFFFFFFF, (hashed_word >> 32) | 1
+
+    return min(row[(first_hash + i * second_hash) % sketch["width"]] for i, row in enumerate(sketch["table"]))
+
+
+def update_heavy_hitters(sketch, word, estimate):
+    """Keep the word among the most frequent words if its estimated count is high enough.
+
+    Args:
+        sketch (dict): Sketch of the text.
+        word (str): Counted word.
+        estimate (int): Estimated number of occurrences of the word.
+    """
+    candidates = sketch["candidates"]
+    if word in candidates or len(candidates) < sketch["heavy_hitters"]:
+        candidates[word] = estimate
+        return
+    # Estimates only grow, so the last known minimum is a lower bound of the current one
+    if estimate <= sketch["threshold"]:
+        return
+    least_frequent = min(candidates, key=candidates.get)
+    if estimate > candidates[least_frequent]:
+        del candidates[least_frequent]
+        candidates[word] = estimate
+        least_frequent = min(candidates, key=candidates.get)
+    sketch["threshold"] = candidates[least_frequent]
+
+
+def update_extreme_words(sketch, words):
+    """Keep the words of the shortest and longest length.
+
+    Args:
+        sketch (dict): Sketch of the text.
+        words (iterable): Words to be checked.
+    """
+    for kind, better in (("shortest_words", lambda a, b: a < b), ("longest_words", lambda a, b: a > b)):
+        extreme_words = sketch[kind]
+        length = len(next(iter(extreme_words))) if extreme_words else None
+        for word in words:
+            if length is None or better(len(word), length):
+                extreme_words.clear()
+                length = len(word)
+            if len(word) == length:
+                extreme_words.add(word)
+
+
+def add_to_sketch(sketch, frequencies):
+    """Add counted words to the sketch.
+
+    Args:
+        sketch (dict): Sketch of the text, it is updated.
+        frequencies (Counter): Number of occurrences of words.
+    """
+    width, table, precision, registers = sketch["width"], sketch["table"], sketch["precision"], sketch["registers"]
+    for word, count in frequencies.items():
+        hashed_word = word_hash(word)
+        first_hash, second_hash = hashed_word & 0xFFFFFFFF, (hashed_word >> 32) | 1
+        estimate = None
+        for i, row in enumerate(table):
+            index = (first_hash + i * second_hash) % width
+            row[index] += count
+            estimate = row[index] if estimate is None else min(estimate, row[index])
+        update_heavy_hitters(sketch, word, estimate)
+
+        # First bits of the hash choose the register, it keeps the most leading zeros of the other bits
+        register = hashed_word >> (64 - precision)
+        rest = hashed_word & ((1 << (64 - precision)) - 1)
+        registers[register] = max(registers[register], 64 - precision - rest.bit_length() + 1)
+    update_extreme_words(sketch, frequencies)
+
+
+def estimate_distinct_words(sketch):
+    """Estimate the number of distinct words with HyperLogLog.
+
+    Args:
+        sketch (dict): Sketch of the text.
+
+    Returns:
+        int: Estimated number of distinct words.
+    """
+    registers = sketch["registers"]
+    m = len(registers)
+    estimate = 0.7213 / (1 + 1.079 / m) * m * m / sum(2.0 ** -register for register in registers)
+    # Linear counting is more accurate while many registers are still empty
+    empty_registers = registers.count(0)
+    if estimate <= 2.5 * m and empty_registers:
+        estimate = m * math.log(m / empty_registers)
+
+    return round(estimate)
+
+
+def merge_sketches(sketch, other_sketch):
+    """Add another sketch (of a separate text with the same settings) to the sketch.
+
+    Args:
+        sketch (dict): Sketch to be updated.
+        other_sketch (dict): Sketch to be added.
+
+    Returns:
+        dict: Merged sketch.
+    """
+    if (sketch["width"], sketch["depth"], sketch["precision"]) != \
+            (other_sketch["width"], other_sketch["depth"], other_sketch["precision"]):
+        raise ValueError("Sketches with different error bounds can not be merged.")
+
+    for row, other_row in zip(sketch["table"], other_sketch["table"]):
+        for index, count in enumerate(other_row):
+            if count:
+                row[index] += count
+    for register, value in enumerate(other_sketch["registers"]):
+        if value > sketch["registers"][register]:
+            sketch["registers"][register] = value
+
+    # Candidates of both sketches are estimated again from the merged counts
+    candidates = {word: estimate_count(sketch, word) for word in {**sketch["candidates"], **other_sketch["candidates"]}}
+    sketch["candidates"] = dict(heapq.nlargest(sketch["heavy_hitters"], candidates.items(), key=lambda x: x[1]))
+    sketch["threshold"] = min(sketch["candidates"].values(), default=0)
+
+    update_extreme_words(sketch, other_sketch["shortest_words"] | other_sketch["longest_words"])
+    merge_counts(sketch["counts"], other_sketch["counts"], join_sentences=False)
+
+    return sketch
+
+
+def save_sketch(sketch, path):
+    """Save the sketch to a JSON file, so it can be merged with the sketches of other runs.
+
+    Args:
+        sketch (dict): Sketch to be saved.
+        path (str): Path of the file.
+    """
+    data = dict(sketch)
+    data["table"] = [base64.b64encode(row.tobytes()).decode() for row in sketch["table"]]
+    data["registers"] = base64.b64encode(bytes(sketch["registers"])).decode()
+    data["shortest_words"] = sorted(sketch["shortest_words"])
+    data["longest_words"] = sorted(sketch["longest_words"])
+    with open(path, "w") as sketch_file:
+        json.dump(data, sketch_file)
+
+
+def load_sketch(path):
+    """Load a sketch saved by save_sketch.
+
+    Args:
+        path (str): Path of the file.
+
+    Returns:
+        dict: Loaded sketch.
+    """
+    with open(path, "r") as sketch_file:
+        sketch = json.load(sketch_file)
+    table = []
+    for row in sketch["table"]:
+        table.append(array.array("Q"))
+        table[-1].frombytes(base64.b64decode(row))
+    sketch["table"] = table
+    sketch["registers"] = bytearray(base64.b64decode(sketch["registers"]))
+    sketch["shortest_words"] = set(sketch["shortest_words"])
+    sketch["longest_words"] = set(sketch["longest_words"])
+    sketch["counts"]["frequencies"] = Counter()
+
+    return sketch
+
+
+def analyze_file_approximate(file_input, sketch, chunk_size=1024 * 1024):
+    """Count given file into a sketch part by part. Words of every part are added to the sketch and
+       then dropped, so memory does not grow with the vocabulary.
+
+    Args:
+        file_input (file): File to be analyzed.
+        sketch (dict): Sketch to count the file into (see create_sketch).
+        chunk_size (int): Number of characters to read at once.
+
+    Returns:
+        dict: Sketch of the file.
+    """
+    counts = empty_counts()
+    for chunk in read_chunks(file_input, chunk_size):
+        chunk_counts = count_text(chunk)
+        add_to_sketch(sketch, chunk_counts["frequencies"])
+        chunk_counts["frequencies"] = Counter()
+        merge_counts(counts, chunk_counts)
+    merge_counts(sketch["counts"], counts, join_sentences=False)
+
+    return sketch
+
+
+def write_approximate_report(file_output, input_name, sketch, top=None):
+    """Write the report of a sketch. Estimated values are marked with "~".
+
+    Args:
+        file_output (file): File to write the report to.
+        input_name (str): Name of the analyzed file.
+        sketch (dict): Sketch of the text.
+        top (int): Number of the most frequent words to write, all kept words if it is None.
+    """
+    counts = sketch["counts"]
+    file_output.write('Statistics about {:<7}:\n'.format(input_name))
+    file_output.write(f'{"#Words":<24}: {counts["words"]}\n')
+    file_output.write(f'{"#Sentences":<24}: {counts["sentences"]}\n')
+    file_output.write(f'{"#Words/#Sentences":<24}: {counts["words"] / counts["sentences"]:.2f}\n')
+    file_output.write(f'{"#Characters":<24}: {counts["characters"]}\n')
+    file_output.write(f'{"#Characters (Just Words)":<24}: {counts["word_characters"]}\n')
+    file_output.write(f'{"#Distinct Words":<24}: ~{estimate_distinct_words(sketch)}\n')
+
+    number_of_words = counts["words"]
+    for title, kind in (("Shortest", "shortest_words"), ("Longest", "longest_words")):
+        words = sorted(((word, estimate_count(sketch, word) / number_of_words) for word in sketch[kind]),
+                       key=lambda x: (-x[1], x[0]))
+        if len(words) > 1:
+            file_output.write(f'{"The " + title + " Words":<24}:\n')
+        else:
+            file_output.write(f'{"The " + title + " Word":<24}: ')
+        for word, frequency in words:
+            file_output.write('{:<24} (~{:.4f})\n'.format(word, frequency))
+
+    frequencies = {word: count / number_of_words for word, count in sketch["candidates"].items()}
+    file_output.write(f'{"Words and Frequencies":<24}:')
+    for word, frequency in most_frequent_words(frequencies, top):
+        file_output.write(f'\n{word:<24}: ~{frequency:.4f}')
+
+
+def create_ngram_table(n, capacity=1024):
+    """Create an empty table of n-grams. Words are numbered in the order they are seen and n-grams are
+       kept as the numbers of their words in arrays of an open addressing hash table (one array for each
+       position of the n-gram and one for the counts), so an n-gram takes a few bytes instead of a tuple
+       of strings.
+
+    Args:
+        n (int): Number of words in an n-gram.
+        capacity (int): Initial number of slots, it must be a power of two.
+
+    Returns:
+        dict: Empty n-gram table.
+    """
+    if n < 1:
+        raise ValueError("Number of words in an n-gram must be at least 1.")
+
+    return {
+        "n": n,
+        "vocabulary": {},
+        "words": [],
+        "word_counts": array.array("Q"),
+        "keys": [array.array("I", bytes(4 * capacity)) for position in range(n)],
+        # Empty slots have zero count
+        "counts": array.array("Q", bytes(8 * capacity)),
+        "size": 0,
+        "total": 0,
+        # Numbers of the last n - 1 words of the sentence that continues in the next part of the text
+        "tail": [],
+    }
+
+
+def find_ngram_slot(table, ngram):
+    """Find the slot of an n-gram, or the empty slot where it is to be added.
+
+    Args:
+        table (dict): N-gram table.
+        ngram (tuple): Numbers of the words of the n-gram.
+
+    Returns:
+        int: Index of the slot.
+    """
+    keys, counts = table["keys"], table["counts"]
+    mask = len(counts) - 1
+    # Hash of a tuple of integers is the same in every run, linear probing keeps the search in one place
+    index = hash(ngram) & mask
+    while counts[index]:
+        if all(keys[position][index] == word for position, word in enumerate(ngram)):
+            return index
+        index = (index + 1) & mask
+
+    return index
+
+
+def resize_ngram_table(table, capacity):
+    """Move the n-grams of the table to new arrays of given capacity.
+
+    Args:
+        table (dict): N-gram table, it is updated.
+        capacity (int): Number of slots, it must be a power of two and more than the number of n-grams.
+    """
+    old_keys, old_counts = table["keys"], table["counts"]
+    table["keys"] = [array.array("I", bytes(4 * capacity)) for position in range(table["n"])]
+    table["counts"] = array.array("Q", bytes(8 * capacity))
+    for index, count in enumerate(old_counts):
+        if count:
+            ngram = tuple(keys[index] for keys in old_keys)
+            slot = find_ngram_slot(table, ngram)
+            for position, word in enumerate(ngram):
+                table["keys"][position][slot] = word
+            table["counts"][slot] = count
+
+
+def add_ngram_counts(table, ngram_counts):
+    """Add the counts of n-grams to the table.
+
+    Args:
+        table (dict): N-gram table, it is updated.
+        ngram_counts (dict): Number of occurrences of n-grams (tuples of word numbers).
+    """
+    # The table is kept at most two thirds full, so the probes stay short
+    needed = (table["size"] + len(ngram_counts)) * 3 // 2
+    if needed >= len(table["counts"]):
+        resize_ngram_table(table, 1 << needed.bit_length())
+
+    keys, counts = table["keys"], table["counts"]
+    for ngram, count in ngram_counts.items():
+        slot = find_ngram_slot(table, ngram)
+        if not counts[slot]:
+            for position, word in enumerate(ngram):
+                keys[position][slot] = word
+            table["size"] += 1
+        counts[slot] += count
+
+
+def word_numbers(table, words):
+    """Get the numbers of words in the table, new words are numbered and their occurrences are counted.
+
+    Args:
+        table (dict): N-gram table, it is updated.
+        words (list): Words to be numbered.
+
+    Returns:
+        list: Numbers of the words.
+    """
+    vocabulary, word_counts = table["vocabulary"], table["word_counts"]
+    for word, count in Counter(words).items():
+        if word not in vocabulary:
+            vocabulary[word] = len(table["words"])
+            table["words"].append(word)
+            word_counts.append(0)
+        word_counts[vocabulary[word]] += count
+
+    return [vocabulary[word] for word in words]
+
+
+def count_ngrams(table, text):
+    """Count the n-grams of given text into the table. Words are found by the same tokenizer as the other
+       statistics and n-grams do not cross ends of sentences between words, but the last sentence of the
+       text continues in the next text counted into the table, so a text can be counted part by part if
+       it is cut at white-spaces (see read_chunks).
+
+    Args:
+        table (dict): N-gram table, it is updated.
+        text (str): Input text to be analyzed.
+
+    Returns:
+        dict: N-gram table.
+    """
+    n = table["n"]
+    lowercase_text = text.lower()
+    # Places of the removed punctuations, so places in the text can be found in the text without them
+    removed_starts, removed_ends, removed_before = [], [], []
+    removed = 0
+    for match in WORD_PUNCTUATION.finditer(lowercase_text):
+        removed_starts.append(match.start())
+        removed_ends.append(match.end())
+        removed_before.append(removed)
+        removed += match.end() - match.start()
+    tokenized_text = WORD_PUNCTUATION.sub("", lowercase_text)
+
+    # Ends of sentences in the text without punctuations, an end inside a removed punctuation is at its start
+    sentence_ends = []
+    for match in SENTENCE_END.finditer(lowercase_text):
+        index = bisect.bisect_right(removed_starts, match.start()) - 1
+        if index < 0:
+            sentence_ends.append(match.start())
+        elif match.start() < removed_ends[index]:
+            sentence_ends.append(removed_starts[index] - removed_before[index])
+        else:
+            sentence_ends.append(match.start() - removed_before[index] - (removed_ends[index] - removed_starts[index]))
+
+    # Words are cut into sentences only at the ends between them, ends inside words (such as "3.14") are skipped
+    words = list(NON_SPACES.finditer(tokenized_text))
+    word_starts = [match.start() for match in words]
+    numbers = word_numbers(table, [match.group() for match in words])
+    first_words = []
+    for sentence_end in sentence_ends:
+        index = bisect.bisect_right(word_starts, sentence_end)
+        if (index == 0 or words[index - 1].end() <= sentence_end) and first_words[-1:] != [index]:
+            first_words.append(index)
+
+    sentences = []
+    sequence, start = table["tail"], 0
+    for first_word in first_words:
+        sentences.append(sequence + numbers[start:first_word])
+        sequence, start = [], first_word
+    sentences.append(sequence + numbers[start:])
+
+    ngram_counts = Counter()
+    for sentence in sentences:
+        ngram_counts.update(zip(*(sentence[position:] for position in range(n))))
+    table["tail"] = sentences[-1][max(len(sentences[-1]) - n + 1, 0):]
+    add_ngram_counts(table, ngram_counts)
+    table["total"] += sum(ngram_counts.values())
+
+    return table
+
+
+def ngram_items(table):
+    """Get the n-grams of the table.
+
+    Args:
+        table (dict): N-gram table.
+
+    Yields:
+        tuple: N-gram (tuple of words) and its number of occurrences.
+    """
+    words, keys = table["words"], table["keys"]
+    for index, count in enumerate(table["counts"]):
+        if count:
+            yield tuple(words[position_keys[index]] for position_keys in keys), count
+
+
+def merge_ngram_tables(table, other_table):
+    """Add the n-grams of another table (of a separate text) to the table. Words are numbered
+       in the order they were seen, so the numbers of the other table are mapped to the numbers of the table.
+
+    Args:
+        table (dict): N-gram table to be updated.
+        other_table (dict): N-gram table to be added.
+
+    Returns:
+        dict: Merged table.
+    """
+    if table["n"] != other_table["n"]:
+        raise ValueError("Tables of n-grams of different lengths can not be merged.")
+
+    word_map = array.array("I", bytes(4 * len(other_table["words"])))
+    vocabulary = table["vocabulary"]
+    for number, word in enumerate(other_table["words"]):
+        if word not in vocabulary:
+            vocabulary[word] = len(table["words"])
+            table["words"].append(word)
+            table["word_counts"].append(0)
+        word_map[number] = vocabulary[word]
+        table["word_counts"][vocabulary[word]] += other_table["word_counts"][number]
+
+    # N-grams are added in batches, so the other table is not copied into tuples at once
+    other_keys = other_table["keys"]
+    ngram_counts = {}
+    for index, count in enumerate(other_table["counts"]):
+        if count:
+            ngram_counts[tuple(word_map[keys[index]] for keys in other_keys)] = count
+            if len(ngram_counts) == NGRAM_BATCH_SIZE:
+                add_ngram_counts(table, ngram_counts)
+                ngram_counts = {}
+    add_ngram_counts(table, ngram_counts)
+    # Pruned n-grams of the other table are still counted in its total
+    table["total"] += other_table["total"]
+
+    return table
+
+
+def prune_ngrams(table, min_count):
+    """Remove the n-grams that occur less than min_count times. The table is rebuilt with
+       a capacity for the remaining n-grams, so the memory of the removed ones is freed.
+
+    Args:
+        table (dict): N-gram table, it is updated.
+        min_count (int): Least number of occurrences of the n-grams to keep.
+
+    Returns:
+        dict: Pruned table.
+    """
+    counts = table["counts"]
+    for index, count in enumerate(counts):
+        if 0 < count < min_count:
+            counts[index] = 0
+            table["size"] -= 1
+    # Emptied slots would break the probe sequences of the others, so the rest is moved to new arrays
+    resize_ngram_table(table, 1 << (table["size"] * 3 // 2 + 1).bit_length())
+
+    return table
+
+
+def save_ngram_table(table, path):
+    """Save the n-gram table to a JSON file, so it can be merged with the tables of other runs.
+
+    Args:
+        table (dict): N-gram table to be saved.
+        path (str): Path of the file.
+    """
+    data = {
+        "n": table["n"],
+        "words": table["words"],
+        "word_counts": base64.b64encode(table["word_counts"].tobytes()).decode(),
+        "keys": [base64.b64encode(keys.tobytes()).decode() for keys in table["keys"]],
+        "counts": base64.b64encode(table["counts"].tobytes()).decode(),
+        "size": table["size"],
+        "total": table["total"],
+    }
+    with open(path, "w") as table_file:
+        json.dump(data, table_file)
+
+
+def load_ngram_table(path):
+    """Load an n-gram table saved by save_ngram_table.
+
+    Args:
+        path (str): Path of the file.
+
+    Returns:
+        dict: Loaded n-gram table.
+    """
+    with open(path, "r") as table_file:
+        data = json.load(table_file)
+    table = create_ngram_table(data["n"], 1)
+    table["words"] = data["words"]
+    table["vocabulary"] = {word: number for number, word in enumerate(data["words"])}
+    table["word_counts"].frombytes(base64.b64decode(data["word_counts"]))
+    table["keys"] = []
+    for keys in data["keys"]:
+        table["keys"].append(array.array("I"))
+        table["keys"][-1].frombytes(base64.b64decode(keys))
+    table["counts"] = array.array("Q")
+    table["counts"].frombytes(base64.b64decode(data["counts"]))
+    table["size"], table["total"] = data["size"], data["total"]
+
+    return table
+
+
+def analyze_file_ngrams(file_input, table, chunk_size=1024 * 1024):
+    """Count the n-grams of given file into the table part by part.
+
+    Args:
+        file_input (file): File to be analyzed.
+        table (dict): N-gram table to count the file into (see create_ngram_table).
+        chunk_size (int): Number of characters to read at once.
+
+    Returns:
+        dict: N-gram table of the file.
+    """
+    for chunk in read_chunks(file_input, chunk_size):
+        count_ngrams(table, chunk)
+    # The last sentence of the file does not continue in another file
+    table["tail"] = []
+
+    return table
+
+
+def write_ngram_report(file_output, input_name, table, top=None):
+    """Write the report of an n-gram table. N-grams are written with their number of occurrences and
+       pointwise mutual information (how much more often the words occur together than by chance).
+
+    Args:
+        file_output (file): File to write the report to.
+        input_name (str): Name of the analyzed file.
+        table (dict): N-gram table of the text.
+        top (int): Number of the most frequent n-grams to write, all n-grams if it is None.
+    """
+    number_of_words = sum(table["word_counts"])
+    file_output.write('N-gram statistics about {:<7}:\n'.format(input_name))
+    file_output.write(f'{"#Words":<24}: {number_of_words}\n')
+    file_output.write(f'{"#N-grams":<24}: {table["total"]}\n')
+    file_output.write(f'{"#Distinct N-grams":<24}: {table["size"]}\n')
+
+    # Sort according to count in descending order, if count is the same sort the n-grams alphabetically
+    if top is None:
+        ngrams = sorted(ngram_items(table), key=lambda x: (-x[1], x[0]))
+    else:
+        ngrams = heapq.nsmallest(top, ngram_items(table), key=lambda x: (-x[1], x[0]))
+
+    vocabulary, word_counts = table["vocabulary"], table["word_counts"]
+    file_output.write(f'{"N-grams, Counts and PMI":<24}:')
+    for ngram, count in ngrams:
+        chance = math.prod(word_counts[vocabulary[word]] / number_of_words for word in ngram)
+        pmi = math.log2(count / table["total"] / chance)
+        file_output.write(f'\n{" ".join(ngram):<24}: {count} ({pmi:.4f})')
+
+
+def record_stage(profile, stage, start_time):
+    """Add the time since start_time to the stage. When memory allocations are traced (tracemalloc),
+       the largest memory increase during the stage is recorded too.
+
+    Args:
+        profile (dict): Times and memory of the stages (see new_profile), nothing is recorded if it is None.
+        stage (str): Name of the stage.
+        start_time (float): Start of the stage (time.perf_counter()).
+
+    Returns:
+        float: Current time, the start of the next stage.
+    """
+    now = time.perf_counter()
+    if profile is None:
+        return now
+
+    stage_profile = profile["stages"].setdefault(stage, {"seconds": 0, "calls": 0, "peak_memory": 0})
+    stage_profile["seconds"] += now - start_time
+    stage_profile["calls"] += 1
+    if tracemalloc.is_tracing():
+        current_memory, peak_memory = tracemalloc.get_traced_memory()
+        stage_profile["peak_memory"] = max(stage_profile["peak_memory"], peak_memory - profile["memory"])
+        profile["memory"] = current_memory
+        tracemalloc.reset_peak()
+
+    return time.perf_counter()
+
+
+def new_profile():
+    """Create an empty profile of the stages.
+
+    Returns:
+        dict: Empty profile.
+    """
+    return {"stages": {}, "memory": tracemalloc.get_traced_memory()[0] if tracemalloc.is_tracing() else 0}
+
+
+def write_profile(profile, number_of_bytes):
+    """Print times and memory of the stages.
+
+    Args:
+        profile (dict): Times and memory of the stages.
+        number_of_bytes (int): Size of the analyzed file.
+    """
+    total_seconds = sum(stage["seconds"] for stage in profile["stages"].values())
+    print(f'{"Stage":<12} {"Seconds":>10} {"Calls":>8} {"Peak memory (KB)":>18}')
+    for name, stage in profile["stages"].items():
+        print(f'{name:<12} {stage["seconds"]:>10.4f} {stage["calls"]:>8} {stage["peak_memory"] / 1024:>18.1f}')
+    print(f'{"Total":<12} {total_seconds:>10.4f}')
+    if total_seconds:
+        print(f"Throughput: {number_of_bytes / total_seconds / 1024 / 1024:.2f} MB/s")
+
+
+def parse_arguments(arguments):
+    """Separate options (given as --name or --name=value) from file names.
+
+    Args:
+        arguments (list): Command line arguments.
+
+    Returns:
+        tuple: List of file names and dictionary of options.
+    """
+    files = [argument for argument in arguments if not argument.startswith("--")]
+    options = {}
+    for argument in arguments:
+        if argument.startswith("--"):
+            name, _, value = argument[2:].partition("=")
+            options[name] = value
+
+    return files, options
+
+
+def check_options(options):
+    """Check that only one mode is chosen and that every option is used by it, options that
+       would be ignored are rejected.
+
+    Args:
+        options (dict): Options given on the command line, ValueError is raised if they can not be used together.
+    """
+    # Options used only by some modes, --stream and --top are used by all of them
+    mode_options = {
+        "corpus": {"workers", "cache", "format"},
+        "approximate": {"epsilon", "delta", "heavy-hitters", "precision", "save-sketch", "merge-sketch"},
+        "ngrams": {"min-count", "save-ngrams", "merge-ngrams"},
+        None: {"workers", "cache", "format", "profile"},
+    }
+    modes = [mode for mode in ("corpus", "approximate", "ngrams") if mode in options]
+    if len(modes) > 1:
+        raise ValueError("Only one of --corpus, --approximate and --ngrams can be used.")
+    mode = modes[0] if modes else None
+
+    for option in options:
+        owners = [owner for owner, used_options in mode_options.items() if option in used_options]
+        if owners and mode not in owners:
+            if mode is None:
+                raise ValueError(f"--{option} can only be used with --{owners[0]}.")
+            raise ValueError(f"--{option} can not be used with --{mode}.")
+    # Stages of the worker processes can not be timed from here, and only the file of one
+    # process is counted with the cache
+    for option in ("profile", "cache"):
+        if mode is None and option in options and "workers" in options:
+            raise ValueError(f"--{option} can not be used with --workers.")
+
+
 def main():
-    if len(argv) != 3:
-        print("It should be: python text_analyzer.py <input_file> <output_file>")
+    # English locale is used when the host has it, the report does not depend on it
+    try:
+        locale.setlocale(locale.LC_ALL, "en_US")
+    except locale.Error:
+        pass
+
+    files, options = parse_arguments(argv[1:])
+    if len(files) != 2:
+        print("It should be: python text_analyzer.py <input_file> <output_file> "
+              "[--stream[=CHUNK_SIZE]] [--workers[=N]] [--top=N] [--cache=DIRECTORY] [--format=text|jsonl|csv] "
+              "[--profile]\n"
+              "or: python text_analyzer.py <input_file> <output_file> --approximate [--epsilon=E] [--delta=D] "
+              "[--heavy-hitters=K] [--precision=P] [--save-sketch=FILE] [--merge-sketch=FILE,...]\n"
+              "or: python text_analyzer.py <input_file> <output_file> --ngrams[=N] [--min-count=C] [--top=N] "
+              "[--save-ngrams=FILE] [--merge-ngrams=FILE,...]\n"
+              "or: python text_analyzer.py --corpus <input_directory_or_glob> <output_directory> [--workers=N] [--top=N] "
+              "[--cache=DIRECTORY] [--format=text|jsonl|csv]")
+        return
+
+    if (options.get("format") or "text") not in ("text", "jsonl", "csv"):
+        print(f"Unknown report format: {options['format']}")
         return
 
     try:
-        with open(argv[1], "r") as file_input:
-            text = file_input.read()
+        check_options(options)
+        top = int(options["top"]) if options.get("top") else None
+        if "corpus" in options:
+            analyze_corpus(files[0], files[1], int(options.get("workers") or 0),
+                           int(options.get("stream") or 1024 * 1024), top, options.get("cache"),
+                           options.get("format") or "text")
+            return
 
-            if not text:
+        if "approximate" in options:
+            sketch = create_sketch(
+                float(options.get("epsilon") or 0.001), float(options.get("delta") or 0.01),
+                # At least the written words are kept, the report shows only the top of them
+                max(top or 0, int(options.get("heavy-hitters") or 100)), int(options.get("precision") or 14)
+            )
+            with open(files[0], "r") as file_input:
+                analyze_file_approximate(file_input, sketch, int(options.get("stream") or 1024 * 1024))
+            if sketch["counts"]["characters"] == 0:
                 print("Input text is empty.")
                 return
+            # Sketches of other runs are added to this one
+            for path in filter(None, (options.get("merge-sketch") or "").split(",")):
+                merge_sketches(sketch, load_sketch(path))
+            if options.get("save-sketch"):
+                save_sketch(sketch, options["save-sketch"])
+            with open(files[1], "w") as file_output:
+                write_approximate_report(file_output, files[0], sketch, top)
+            return
 
-        with open(argv[2], "w") as file_output:
-             file_output.write('Statistics about {:<7}:\n'.format(argv[1]))
-             file_output.write(f'{"#Words":<24}: {len(number_of_words(text))}\n')
-             file_output.write(f'{"#Sentences":<24}: {number_of_sentences(text)}\n')
-             file_output.write(f'{"#Words/#Sentences":<24}: {average_of_words_per_sentence(text):.2f}\n')
-             file_output.write(f'{"#Characters":<24}: {number_of_all_characters(text)}\n')
-             file_output.write(f'{"#Characters (Just Words)":<24}: {number_of_all_characters_just_words(text)}\n')
-
-             # Check if there is more than one shortest word and format output according to it
-             if len(shortest_word(text)) > 1:
-                file_output.write(f'{"The Shortest Words":<24}:\n')
-             else:
-                file_output.write(f'{"The Shortest Word":<24}: ')
-             for word, frequency in shortest_word(text):
-                file_output.write('{:<24} ({:.4f})\n'.format(word, frequency))
-
-             # Check if there is more than one longest word and format output according to it
-             if len(longest_word(text)) > 1:
-                file_output.write(f'{"The Longest Words":<24}:\n')
-             else:
-                file_output.write(f'{"The Longest Word":<24}: ')
-             for word, frequency in longest_word(text):
-                file_output.write('{:<24} ({:.4f})\n'.format(word, frequency))
-
-             # Sort according to frequency in descending order,
-             # if frequency is the same sort it according to the increasing alphabetical order
-             sorted_frequencies = sorted(words_frequency(text).items(), key=lambda x: (-x[1], x[0]))
-             file_output.write(f'{"Words and Frequencies":<24}:')
-             for word, frequency in sorted_frequencies:
-                 file_output.write(f'\n{word:<24}: {frequency:.4f}')
+        if "ngrams" in options:
+            table = create_ngram_table(int(options["ngrams"] or 2))
+            with open(files[0], "r") as file_input:
+                analyze_file_ngrams(file_input, table, int(options.get("stream") or 1024 * 1024))
+            # Tables of other runs are added to this one
+            for path in filter(None, (options.get("merge-ngrams") or "").split(",")):
+                merge_ngram_tables(table, load_ngram_table(path))
+            if not table["words"]:
+                print("Input text is empty.")
+                return
+            # The table is saved before pruning, so n-grams that are rare in every run can still add up
+            if options.get("save-ngrams"):
+                save_ngram_table(table, options["save-ngrams"])
+            prune_ngrams(table, int(options.get("min-count") or 1))
+            with open(files[1], "w") as file_output:
+                write_ngram_report(file_output, files[0], table, top)
+            return
+
+        chunk_size = int(options.get("stream") or 1024 * 1024)
+        profile = None
+        if "profile" in options:
+            # Memory allocations are traced only while profiling, because tracing slows the analysis down
+            tracemalloc.start()
+            profile = new_profile()
+        if "workers" in options:
+            with open(files[0], "r") as file_input:
+                analysis = analyze_file_parallel(file_input, chunk_size, int(options["workers"] or 0))
+        else:
+            if options.get("cache"):
+                counts = count_file_cached(files[0], options["cache"], chunk_size, profile)
+            else:
+                counts = count_file(files[0], chunk_size, profile)
+            stage_start = time.perf_counter()
+            analysis = summarize_counts(counts)
+            record_stage(profile, "summarize", stage_start)
+
+        if analysis["characters"] == 0:
+            print("Input text is empty.")
+            return
+
+        stage_start = time.perf_counter()
+        with open(files[1], "w") as file_output:
+            write_report(file_output, files[0], analysis, top, options.get("format") or "text")
+        if profile is not None:
+            record_stage(profile, "report", stage_start)
+            tracemalloc.stop()
+            write_profile(profile, os.path.getsize(files[0]))
     except FileNotFoundError:
         print("Input file does not exist.")
         return
     except PermissionError:
         print("Permission denied.")
         return
+    except OSError as e:
+        print(f"{type(e).__name__}: {e}")
+        return
+    except ValueError as e:
+        print(e)
+        return
 
 
 if __name__ == '__main__':
-    main()
\ No newline at end of file
+    main()